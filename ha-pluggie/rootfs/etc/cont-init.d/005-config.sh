@@ -113,6 +113,13 @@ if [ -f "/usr/lib/nginx/modules/ngx_http_brotli_filter_module.so" ]; then
     bashio::log.debug "Brotli module detected, enabling compression"
 fi
 
+# Serve precompressed brotli assets in the admin interface if the static
+# module is installed
+BROTLI_STATIC=""
+if [ -f "/usr/lib/nginx/modules/ngx_http_brotli_static_module.so" ]; then
+    BROTLI_STATIC="    brotli_static on;"
+fi
+
 # /etc/nginx/nginx.conf
 cat <<EOF > "/etc/nginx/nginx.conf"
 user nginx;
@@ -221,6 +228,19 @@ server {
     access_log off;
     error_log /dev/null;
 
+    # Precompressed .gz/.br variants are written at image build time
+    gzip_static on;
+${BROTLI_STATIC}
+    # Pages are revalidated on every load (ETag / If-None-Match)
+    location / {
+        add_header Cache-Control "no-cache";
+    }
+
+    # Content-hashed assets never change under the same name
+    location ~ "\.[0-9a-f]{12}\.(png|ico|svg|css|js)\$" {
+        add_header Cache-Control "public, max-age=31536000, immutable";
+    }
+
     location /pluggie/api/ {
         proxy_pass http://127.0.0.1:8000;
         proxy_set_header Host \$host;
@@ -246,9 +266,16 @@ api_connected=0
 
 bashio::log.debug "api_connected: ${api_connected}"
 
+# get_config.py exit codes: settings identical to the applied ones, and
+# settings changed but already applied to the running WireGuard interface
+GET_CONFIG_UNCHANGED=3
+GET_CONFIG_UPDATED_LIVE=4
+
 while [ ${api_connected} -eq 0 ]; do
     bashio::log.debug "Connecting to Pluggie API..."
-    if /usr/local/bin/get_config.py; then
+    ret=0
+    /usr/local/bin/get_config_client.py || ret=$?
+    if [ $ret -eq 0 ] || [ $ret -eq ${GET_CONFIG_UNCHANGED} ] || [ $ret -eq ${GET_CONFIG_UPDATED_LIVE} ]; then
         # Check tunnel state
         if [ -f "/etc/pluggie.state" ] && [ "$(cat /etc/pluggie.state)" = "disabled" ]; then
             bashio::log.warning "Tunnel is disabled. Will check again in 60 seconds..."
@@ -264,7 +291,6 @@ while [ ${api_connected} -eq 0 ]; do
             bashio::log.debug "Configuration written successfully."
         fi
     else
-        ret=$?
         if [ $ret -eq 1 ]; then
             current_state=""
             if [ -f "/etc/pluggie.state" ]; then
@@ -278,13 +304,15 @@ while [ ${api_connected} -eq 0 ]; do
 
             elif [ "${current_state}" = "no_connection" ]; then
                 # API unreachable and no existing WG configuration — just retry
-                bashio::log.warning "Cannot reach API server and no existing configuration. Retrying in 30 seconds..."
-                sleep 30
+                delay=$(/usr/local/bin/retry_scheduler.py failure apiserver || echo 30)
+                bashio::log.warning "Cannot reach API server and no existing configuration. Retrying in ${delay} seconds..."
+                sleep "${delay}"
 
             elif [ "${current_state}" = "endpoint_unreachable" ]; then
                 # API works but Pluggie endpoint is down, no existing WG config — retry
-                bashio::log.warning "Pluggie endpoint unreachable and no existing configuration. Retrying in 30 seconds..."
-                sleep 30
+                delay=$(/usr/local/bin/retry_scheduler.py failure apiserver || echo 30)
+                bashio::log.warning "Pluggie endpoint unreachable and no existing configuration. Retrying in ${delay} seconds..."
+                sleep "${delay}"
 
             elif [ "${current_state}" = "invalid_key" ]; then
                 # Truly invalid access key (confirmed by API server with 401)
@@ -307,9 +335,16 @@ while [ ${api_connected} -eq 0 ]; do
 
             else
                 # Unknown state — treat as connectivity problem, retry
-                bashio::log.warning "get_config.py failed (state: '${current_state}'). Retrying in 30 seconds..."
-                sleep 30
+                delay=$(/usr/local/bin/retry_scheduler.py failure apiserver || echo 30)
+                bashio::log.warning "get_config.py failed (state: '${current_state}'). Retrying in ${delay} seconds..."
+                sleep "${delay}"
             fi
+        else
+            delay=$(/usr/local/bin/retry_scheduler.py failure apiserver || echo 30)
+            bashio::log.warning "get_config.py failed (exit code ${ret}). Retrying in ${delay} seconds..."
+            sleep "${delay}"
         fi
     fi
 done
+
+/usr/local/bin/retry_scheduler.py success apiserver >/dev/null || true
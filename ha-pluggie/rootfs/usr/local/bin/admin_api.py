@@ -1,23 +1,133 @@
 #!/usr/local/bin/python
 
 import os
+import copy
+import gzip
+import hashlib
 import json
 import logging
 import sys
 import threading
 import time
+import queue
 import signal
-import requests
+import socket
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 from http.server import HTTPServer, BaseHTTPRequestHandler
 import urllib.parse
-from cert_verify import start_verification_thread, get_last_result, run_verification
+import atomic_file
+import http_client
+import retry_scheduler
+from jobs import JobQueue, Step
+from cert_verify import (
+    start_verification_thread, get_last_result, request_verification,
+    get_job, add_result_listener,
+)
 from logger import setup_logging, reload_options_log_level
+from metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE
+
+# requests is imported where it is used, so the server can bind its port
+# before requests and urllib3 are loaded (ssl is already pulled in by
+# http.server)
 
 if os.environ.get("SUPERVISOR_TOKEN"):
     OPTIONS_FILE = "/ssl/pluggie/pluggie.json"
 else:
     OPTIONS_FILE = "/data/pluggie.json"
 
+STATE_FILE = "/etc/pluggie.state"
+
+# Worker pool sizes for the two request lanes
+FAST_LANE_WORKERS = 8
+SLOW_LANE_WORKERS = 4
+# How long the accept thread waits for the request line to pick a lane.
+# Connections that have not sent it by then go to the slow lane.
+REQUEST_PEEK_TIMEOUT = 0.05
+
+# Endpoints that wait on outbound network calls. They are served from a
+# separate pool so that local endpoints never queue behind them.
+_SLOW_LANE_PATHS = frozenset({
+    '/pluggie/api/traffic',
+    '/pluggie/api/proxy-check',
+    '/pluggie/api/dashboard',
+})
+
+# Server-sent event streams. They are long-lived, so each one gets its own
+# thread, capped at EVENT_STREAM_LIMIT concurrent streams.
+EVENTS_PATH = '/pluggie/api/events'
+EVENT_STREAM_LIMIT = 16
+# Seconds between keep-alive comments on an idle stream
+EVENT_KEEPALIVE_INTERVAL = 15
+# Events buffered per stream before a slow client starts missing events
+EVENT_QUEUE_SIZE = 64
+# Interval of the state and options file watcher
+FILE_WATCH_INTERVAL = 1.0
+
+# Background checks of the proxied host
+PROXY_PROBE_INTERVAL = 60
+# Probe samples kept for latency percentiles (2 hours at the default interval)
+PROXY_PROBE_SAMPLES = 120
+# How long /proxy-check waits for the very first probe to finish
+PROXY_FIRST_PROBE_WAIT = 6
+DEFAULT_HA_PROXIED_HOST = "http://homeassistant.local.hass.io:8123"
+
+# Background apiserver reachability checks behind /status
+CONNECTIVITY_CHECK_INTERVAL = 60
+CONNECTIVITY_BACKOFF_MIN = 5
+CONNECTIVITY_BACKOFF_MAX = 300
+_CONNECTIVITY_RETRY = retry_scheduler.Policy(
+    interval=CONNECTIVITY_CHECK_INTERVAL,
+    base=CONNECTIVITY_BACKOFF_MIN,
+    cap=CONNECTIVITY_BACKOFF_MAX,
+    floor=CONNECTIVITY_BACKOFF_MIN,
+)
+
+# Serializes read-modify-write cycles on OPTIONS_FILE between workers
+_options_lock = threading.Lock()
+
+# Minimum interval between identity checks (stat) of OPTIONS_FILE
+OPTIONS_REVALIDATE_INTERVAL = 1.0
+
+# apply_config.sh runs once POSTs to /options have been quiet for
+# APPLY_DEBOUNCE seconds, but never later than APPLY_MAX_DELAY after the
+# first POST of a burst
+APPLY_DEBOUNCE = 1.0
+APPLY_MAX_DELAY = 5.0
+# Lets the POST response go out before the restart stops services
+RESTART_DELAY = 0.5
+# Per-step timeouts (seconds) of apply and restart jobs
+APPLY_TIMEOUT = 120
+RESTART_STEP_TIMEOUT = 60
+# 005-config.sh waits for the apiserver with retry_scheduler backoff;
+# allow this many attempts at the maximum delay before giving up
+CONFIG_STEP_ATTEMPTS = 6
+CONFIG_STEP_TIMEOUT = (retry_scheduler.POLICIES["apiserver"].cap
+                       * CONFIG_STEP_ATTEMPTS)
+# certbot may need a few minutes; after that the letsencrypt service is
+# left running in the background (e.g. waiting for DNS propagation)
+LETSENCRYPT_TIMEOUT = 300
+
+# Default freshness of cached traffic data in seconds. Can be overridden
+# with pluggie_config.traffic_cache_ttl in pluggie.json.
+TRAFFIC_CACHE_TTL = 30
+# Timeout (seconds) of the upstream traffic request
+TRAFFIC_FETCH_TIMEOUT = 10
+# How long a request waits for an in-flight traffic fetch it joined. Each
+# connect attempt of http_client may take the full timeout, and the last
+# one the read as well.
+TRAFFIC_FETCH_WAIT = (
+    TRAFFIC_FETCH_TIMEOUT * (http_client.RETRY_POLICY["connect"] + 2) + 1)
+
+# Responses shorter than this are sent uncompressed
+GZIP_MIN_LENGTH = 512
+
+# Workers computing /pluggie/api/dashboard sections
+DASHBOARD_WORKERS = 8
+# Seconds a dashboard section may take before it is reported as pending
+DASHBOARD_LOCAL_TIMEOUT = 2
+DASHBOARD_REMOTE_TIMEOUT = 3
+
 
 def validate_url(url):
     """
@@ -96,9 +206,698 @@ def _sanitize_options(payload):
     return sanitized
 
 
+class OptionsCache:
+    """
+    Shared, parsed copy of the options file.
+
+    The file is parsed again only when its identity (device, inode, mtime,
+    size) changes, and the identity is checked at most once per
+    revalidate_interval. Derived views (e.g. pre-serialized responses) are
+    built once per parsed version. Returned objects are shared between
+    threads and must be treated as read-only.
+    """
+
+    def __init__(self, path, revalidate_interval=OPTIONS_REVALIDATE_INTERVAL):
+        self._path = path
+        self._revalidate_interval = revalidate_interval
+        self._lock = threading.Lock()
+        self._options = None
+        self._identity = None
+        self._checked_at = 0.0
+        self._views = {}
+
+    def _identity_of_file(self):
+        st = os.stat(self._path)
+        return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _refresh_locked(self):
+        now = time.monotonic()
+        if (self._options is not None
+                and now - self._checked_at < self._revalidate_interval):
+            return self._options
+
+        identity = self._identity_of_file()
+        if self._options is None or identity != self._identity:
+            with open(self._path, 'r') as f:
+                options = json.load(f)
+            self._options = options
+            self._identity = identity
+            self._views = {}
+            logging.debug("Options cache loaded from %s", self._path)
+        self._checked_at = now
+        return self._options
+
+    def get(self):
+        """Return the parsed options dict (read-only)."""
+        with self._lock:
+            return self._refresh_locked()
+
+    def view(self, name, builder):
+        """
+        Return a derived view of the options, built on first use.
+
+        Args:
+            name (str): Cache key of the view
+            builder (callable): Called with the options dict to build the view
+
+        Returns:
+            The cached result of builder(options)
+        """
+        with self._lock:
+            options = self._refresh_locked()
+            if name not in self._views:
+                self._views[name] = builder(options)
+            return self._views[name]
+
+    def invalidate(self):
+        """Force the next access to re-read the file."""
+        with self._lock:
+            self._options = None
+            self._identity = None
+            self._views = {}
+
+
+_options_cache = OptionsCache(OPTIONS_FILE)
+
+
+def _build_options_view(options):
+    """Serialize options for /pluggie/api/options without the access key."""
+    options = copy.deepcopy(options)
+
+    # Strip the bearer credential from the bulk options dump.
+    # Front-end fetches the raw value on demand via /pluggie/api/access-key.
+    configuration = options.get('configuration')
+    if isinstance(configuration, dict):
+        access_key = configuration.get('access_key')
+        configuration.pop('access_key', None)
+        configuration['access_key_set'] = bool(
+            access_key and access_key != 'XXXXX'
+        )
+
+    return json.dumps(options).encode()
+
+
+def _build_access_key_view(options):
+    """Serialize the /pluggie/api/access-key response."""
+    access_key = options.get('configuration', {}).get('access_key')
+    return json.dumps({
+        "access_key": access_key or "",
+        "access_key_set": bool(access_key and access_key != 'XXXXX')
+    }).encode()
+
+
+def _build_edition_view(options):
+    """Serialize the /pluggie/api/edition response."""
+    edition = "unknown"
+    user_agent = options.get('user_agent', '')
+    if "Docker" in user_agent:
+        edition = "docker"
+    elif "HA" in user_agent:
+        edition = "ha"
+    return json.dumps({"edition": edition}).encode()
+
+
+def _fetch_traffic(api_server, access_key, user_agent):
+    """
+    Fetch traffic data from the apiserver.
+
+    Returns:
+        tuple: (ok, payload) - ok is True when payload is upstream data
+               that may be cached, False for an error payload.
+    """
+    api_url = f"https://{api_server}/api/traffic"
+    headers = {
+        'Authorization': f'Bearer {access_key}',
+        'User-Agent': user_agent
+    }
+
+    import requests
+
+    try:
+        response = http_client.get(
+            api_url, headers=headers, timeout=TRAFFIC_FETCH_TIMEOUT,
+            dependency="apiserver")
+    except requests.exceptions.RequestException as e:
+        logging.debug(f"API connectivity error: {e}")
+        return False, {
+            "status": "error",
+            "message": "N/A at the moment"
+        }
+
+    if response.status_code != 200:
+        return False, {
+            "status": "error",
+            "message": "Traffic data unavailable"
+        }
+
+    return True, response.json()
+
+
+# Marks an empty TrafficCache; None is a valid upstream value (JSON null)
+_NO_VALUE = object()
+
+
+class _TrafficFlight:
+    """A single in-flight upstream traffic fetch shared by its waiters."""
+
+    def __init__(self, key):
+        self.key = key
+        self.done = threading.Event()
+        self.error_payload = None
+
+
+class TrafficCache:
+    """
+    Server-side cache of /api/traffic responses.
+
+    Values younger than the TTL are served directly. Older values are
+    served immediately while one background refresh runs
+    (stale-while-revalidate). Concurrent misses join a single upstream
+    request, and the last good value keeps being served while the
+    apiserver is unreachable. With nothing cached, a failed fetch is
+    served for the TTL before the apiserver is asked again. Cached data
+    is bound to the apiserver and access key it was fetched with.
+    """
+
+    def __init__(self, fetch=_fetch_traffic):
+        self._fetch = fetch
+        self._lock = threading.Lock()
+        self._key = None
+        self._value = _NO_VALUE
+        self._fetched_at = 0.0
+        self._next_refresh_at = 0.0
+        self._error = None
+        self._flight = None
+
+    def _run_fetch(self, key, flight, ttl):
+        api_server, access_key, user_agent = key
+        try:
+            ok, payload = self._fetch(api_server, access_key, user_agent)
+        except Exception as e:
+            logging.error(f"Error retrieving traffic data: {e}")
+            ok, payload = False, {"status": "error", "message": str(e)}
+
+        with self._lock:
+            if key == self._key:
+                now = time.monotonic()
+                if ok:
+                    self._value = payload
+                    self._error = None
+                    self._fetched_at = now
+                    self._next_refresh_at = now + ttl
+                else:
+                    # Back off so a down apiserver is not hit on every request
+                    self._error = payload
+                    self._next_refresh_at = now + ttl
+            if not ok:
+                flight.error_payload = payload
+            if self._flight is flight:
+                self._flight = None
+        flight.done.set()
+
+    def _start_flight_locked(self, key, ttl, background):
+        flight = _TrafficFlight(key)
+        self._flight = flight
+        if background:
+            thread = threading.Thread(
+                target=self._run_fetch, args=(key, flight, ttl), daemon=True)
+            thread.name = "traffic-refresh"
+            thread.start()
+        return flight
+
+    def get(self, api_server, access_key, user_agent, ttl=TRAFFIC_CACHE_TTL):
+        """
+        Return traffic data annotated with cache information.
+
+        The returned dict carries a "cache" entry with "status"
+        (hit, stale or miss) and "age" in seconds of the served value.
+        """
+        key = (api_server, access_key, user_agent)
+        leader = False
+
+        with self._lock:
+            if key != self._key:
+                self._key = key
+                self._value = _NO_VALUE
+                self._error = None
+                self._fetched_at = 0.0
+                self._next_refresh_at = 0.0
+
+            now = time.monotonic()
+            # A flight still running for a previous key is left to finish
+            # on its own; its result is discarded
+            flight = self._flight
+            if flight is not None and flight.key != key:
+                flight = None
+
+            if self._value is not _NO_VALUE:
+                age = now - self._fetched_at
+                if age < ttl:
+                    status = "hit"
+                else:
+                    status = "stale"
+                    if flight is None and now >= self._next_refresh_at:
+                        self._start_flight_locked(key, ttl, background=True)
+                return self._annotate(self._value, status, age)
+
+            if flight is None:
+                if self._error is not None and now < self._next_refresh_at:
+                    return self._annotate(self._error, "miss", None)
+                flight = self._start_flight_locked(key, ttl, background=False)
+                leader = True
+
+        if leader:
+            self._run_fetch(key, flight, ttl)
+        else:
+            flight.done.wait(TRAFFIC_FETCH_WAIT)
+
+        with self._lock:
+            if self._value is not _NO_VALUE and key == self._key:
+                age = time.monotonic() - self._fetched_at
+                return self._annotate(self._value, "miss", age)
+
+        payload = flight.error_payload or {
+            "status": "error",
+            "message": "N/A at the moment"
+        }
+        return self._annotate(payload, "miss", None)
+
+    @staticmethod
+    def _annotate(payload, status, age):
+        # Only a JSON object has room for the cache entry; other upstream
+        # JSON (a list, null) is passed through as is
+        if not isinstance(payload, dict):
+            return payload
+        result = dict(payload)
+        result["cache"] = {
+            "status": status,
+            "age": round(age, 1) if age is not None else None,
+        }
+        return result
+
+
+_traffic_cache = TrafficCache()
+
+
+def _traffic_cache_ttl(options):
+    """Return the traffic cache TTL from pluggie_config or the default."""
+    ttl = options.get('pluggie_config', {}).get('traffic_cache_ttl')
+    if isinstance(ttl, (int, float)) and not isinstance(ttl, bool) and ttl >= 0:
+        return ttl
+    return TRAFFIC_CACHE_TTL
+
+
+class EventBus:
+    """
+    Fan-out of events to connected /pluggie/api/events streams.
+
+    Each subscriber gets a bounded queue. A subscriber that falls behind
+    drops events rather than blocking publishers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._next_id = 1
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event, data):
+        """
+        Send an event to all subscribers.
+
+        Args:
+            event (str): Event name
+            data: JSON-serializable payload
+        """
+        payload = json.dumps(data)
+        with self._lock:
+            event_id = self._next_id
+            self._next_id += 1
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((event_id, event, payload))
+            except queue.Full:
+                logging.debug(f"Dropping {event} event for slow event stream")
+
+
+_event_bus = EventBus()
+
+
+def _percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class ProxyProber:
+    """
+    Periodically checks that the proxied host answers.
+
+    Runs on its own thread and keeps the latest verdict together with a
+    ring buffer of (timestamp, ok, http_status, latency) samples, so
+    /pluggie/api/proxy-check can answer from memory with latency
+    percentiles and the last failure reason. The buffer is reset when
+    the target changes.
+    """
+
+    def __init__(self, interval=PROXY_PROBE_INTERVAL, samples=PROXY_PROBE_SAMPLES):
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._first_probe_done = threading.Event()
+        self._samples = deque(maxlen=samples)
+        self._target = None
+        self._verdict = None
+        self._last_failure = None
+
+    def wake(self):
+        """Run the next probe now instead of at the next interval."""
+        self._wakeup.set()
+
+    @staticmethod
+    def _target_from_options(options):
+        proxied_host = options.get('proxied_host', '')
+        is_ha_addon = "HA" in options.get('user_agent', '')
+
+        # If no proxied_host configured, use default for HA addon
+        if not proxied_host or proxied_host.strip() == '':
+            if not is_ha_addon:
+                return None, is_ha_addon
+            proxied_host = DEFAULT_HA_PROXIED_HOST
+        return proxied_host, is_ha_addon
+
+    @staticmethod
+    def _check(proxied_host, is_ha_addon):
+        """Perform one request and return (verdict, http_status, failure)."""
+        import requests
+
+        try:
+            response = http_client.get(
+                proxied_host,
+                timeout=5,
+                allow_redirects=False,
+                dependency="proxied_host",
+                headers={
+                    'X-Forwarded-For': '127.0.0.1',
+                    'X-Forwarded-Proto': 'https'
+                }
+            )
+        except requests.exceptions.ConnectionError as e:
+            # Connection refused or host unreachable
+            logging.debug(f"Proxy check connection error: {e}")
+            return {
+                "status": "connection_error",
+                "message": "Cannot connect to proxied host",
+                "check_performed": True
+            }, None, "Cannot connect to proxied host"
+        except requests.exceptions.Timeout:
+            logging.debug("Proxy check timeout")
+            return {
+                "status": "timeout",
+                "message": "Connection to proxied host timed out",
+                "check_performed": True
+            }, None, "Connection to proxied host timed out"
+        except Exception as e:
+            logging.debug(f"Proxy check error: {e}")
+            return {
+                "status": "error",
+                "message": str(e),
+                "check_performed": True
+            }, None, str(e)
+
+        if response.status_code == 400:
+            # 400 Bad Request - likely missing trusted_proxies
+            return {
+                "status": "config_required",
+                "message": "Proxied host returned 400 Bad Request. Configuration may be required.",
+                "http_status": 400,
+                "is_ha_addon": is_ha_addon,
+                "check_performed": True
+            }, 400, "HTTP 400 Bad Request"
+
+        # Any other response means the connection works
+        return {
+            "status": "ok",
+            "message": "Proxied host is reachable",
+            "http_status": response.status_code,
+            "check_performed": True
+        }, response.status_code, None
+
+    def probe_once(self):
+        """Probe the configured target and record the outcome."""
+        proxied_host, is_ha_addon = self._target_from_options(_options_cache.get())
+
+        with self._lock:
+            if proxied_host != self._target:
+                self._target = proxied_host
+                self._samples.clear()
+                self._last_failure = None
+
+        if proxied_host is None:
+            # Docker without proxied_host - nothing to check
+            verdict = {
+                "status": "ok",
+                "message": "No proxied host configured",
+                "check_performed": False
+            }
+            sample = None
+            failure = None
+        else:
+            started = time.monotonic()
+            verdict, http_status, failure = self._check(proxied_host, is_ha_addon)
+            latency = time.monotonic() - started
+            sample = (time.time(), failure is None, http_status, latency)
+
+        with self._lock:
+            if proxied_host != self._target:
+                return
+            self._verdict = verdict
+            self._verdict["checked_at"] = time.strftime(
+                "%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            if sample is not None:
+                self._samples.append(sample)
+            if failure is not None:
+                self._last_failure = {
+                    "reason": failure,
+                    "at": self._verdict["checked_at"],
+                }
+        self._first_probe_done.set()
+
+    def run(self):
+        """Probe loop; intended to run as a daemon thread."""
+        while True:
+            self._wakeup.clear()
+            try:
+                self.probe_once()
+            except Exception as e:
+                logging.error(f"Error probing proxied host: {e}")
+            self._wakeup.wait(timeout=self._interval)
+
+    def snapshot(self):
+        """
+        Return the latest verdict with latency statistics.
+
+        Returns:
+            dict: Verdict fields plus "latency_ms" (p50/p95/p99 over
+                  answered probes), "samples", "failures" and
+                  "last_failure"; None if no probe has finished yet.
+        """
+        with self._lock:
+            if self._verdict is None:
+                return None
+            result = dict(self._verdict)
+            samples = list(self._samples)
+            last_failure = self._last_failure
+
+        latencies = sorted(
+            sample[3] * 1000 for sample in samples if sample[2] is not None)
+        result["latency_ms"] = {
+            name: round(value, 1) if value is not None else None
+            for name, value in (
+                ("p50", _percentile(latencies, 50)),
+                ("p95", _percentile(latencies, 95)),
+                ("p99", _percentile(latencies, 99)),
+            )
+        }
+        result["samples"] = len(samples)
+        result["failures"] = sum(1 for sample in samples if not sample[1])
+        result["last_failure"] = last_failure
+        return result
+
+    def wait_first_probe(self, timeout):
+        return self._first_probe_done.wait(timeout)
+
+
+_proxy_prober = ProxyProber()
+
+
+class ConnectivityMonitor:
+    """
+    Checks apiserver reachability while the tunnel state is invalid_key.
+
+    A short access key rejected as invalid may really be a network
+    problem, so the monitor probes https://{apiserver}/health and keeps
+    the verdict in memory; /pluggie/api/status only reads it. Failed
+    checks are retried with jittered exponential backoff, and a transport
+    error switches the state file to connectivity_issue, as the inline
+    check in /status used to do.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._connectivity_issue = False
+        self._checked_at = None
+
+    def wake(self):
+        """Re-evaluate now, e.g. after the state or options changed."""
+        self._wakeup.set()
+
+    def verdict(self):
+        """
+        Return the latest verdict.
+
+        Returns:
+            tuple: (connectivity_issue, checked_at); checked_at is None
+                   while no check applies.
+        """
+        with self._lock:
+            return self._connectivity_issue, self._checked_at
+
+    def _set_verdict(self, connectivity_issue, checked):
+        with self._lock:
+            self._connectivity_issue = connectivity_issue
+            self._checked_at = time.strftime(
+                "%Y-%m-%dT%H:%M:%SZ", time.gmtime()) if checked else None
+
+    def check_once(self):
+        """
+        Run one check if the current state calls for it.
+
+        Returns:
+            bool: True if the apiserver check failed.
+        """
+        if _read_state() != 'invalid_key':
+            self._set_verdict(False, False)
+            return False
+
+        options = _options_cache.get()
+        access_key = options.get('configuration', {}).get('access_key')
+        if access_key == "XXXXX" or not access_key or len(access_key) > 10:
+            # Placeholder or full-length key - the apiserver answered
+            self._set_verdict(False, False)
+            return False
+
+        api_server = options.get('pluggie_config', {}).get('apiserver', 'api.pluggie.net')
+        test_url = f"https://{api_server}/health"
+        try:
+            response = http_client.head(
+                test_url, timeout=3, dependency="apiserver")
+        except Exception as e:
+            logging.debug(f"API connectivity check failed: {e}")
+            self._set_verdict(True, True)
+            # Only replace the state if nothing else changed it meanwhile.
+            # Written in place like the shell scripts do: AppArmor only
+            # allows /etc/pluggie.state itself, not a temp file next to it.
+            if _read_state() == 'invalid_key':
+                with open(STATE_FILE, 'w') as f:
+                    f.write('connectivity_issue')
+            return True
+
+        if response.status_code != 200:
+            logging.debug(f"API connectivity check failed: Status code {response.status_code}")
+            self._set_verdict(True, True)
+            return True
+
+        self._set_verdict(False, True)
+        return False
+
+    def run(self):
+        """Check loop; intended to run as a daemon thread."""
+        failures = 0
+        while True:
+            self._wakeup.clear()
+            try:
+                failed = self.check_once()
+            except Exception as e:
+                logging.error(f"Error checking apiserver connectivity: {e}")
+                failed = True
+
+            failures = failures + 1 if failed else 0
+            delay = retry_scheduler.backoff_delay(_CONNECTIVITY_RETRY, failures)
+            self._wakeup.wait(timeout=delay)
+
+
+_connectivity_monitor = ConnectivityMonitor()
+
+
+def _file_identity(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _read_state():
+    try:
+        with open(STATE_FILE, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _watch_files():
+    """
+    Publish events when the tunnel state or the options file change.
+
+    Runs as a daemon thread started from run().
+    """
+    state_identity = _file_identity(STATE_FILE)
+    state = _read_state()
+    options_identity = _file_identity(OPTIONS_FILE)
+
+    while True:
+        time.sleep(FILE_WATCH_INTERVAL)
+        try:
+            identity = _file_identity(STATE_FILE)
+            if identity != state_identity:
+                state_identity = identity
+                new_state = _read_state()
+                if new_state != state:
+                    state = new_state
+                    _event_bus.publish('status', {"status": state or 'unknown'})
+                    _connectivity_monitor.wake()
+
+            identity = _file_identity(OPTIONS_FILE)
+            if identity != options_identity:
+                options_identity = identity
+                _event_bus.publish('options', json.loads(
+                    _options_cache.view('options', _build_options_view)))
+                # proxied_host, apiserver or the key may have changed
+                _proxy_prober.wake()
+                _connectivity_monitor.wake()
+        except Exception as e:
+            logging.debug(f"Error watching state files: {e}")
+
+
 # Signal handler for reloading config
 def signal_handler(sig, frame):
     logging.info("Received signal to reload config")
+    _options_cache.invalidate()
     reload_options_log_level(OPTIONS_FILE)
 
 
@@ -110,7 +909,355 @@ reload_options_log_level(OPTIONS_FILE)
 signal.signal(signal.SIGUSR1, signal_handler)
 
 
+REGISTRY.describe(
+    "pluggie_admin_requests_total", "counter",
+    "Admin API requests by route, method and status code.",
+)
+REGISTRY.describe(
+    "pluggie_admin_requests_in_flight", "gauge",
+    "Admin API requests currently being served.",
+)
+REGISTRY.describe(
+    "pluggie_admin_request_duration_seconds", "histogram",
+    "Admin API request latency by route.",
+)
+REGISTRY.describe(
+    "pluggie_admin_event_streams", "gauge",
+    "Connected /pluggie/api/events streams.",
+)
+
+
+# Route handlers. GET handlers are called with the parsed query string,
+# POST handlers additionally with the raw request body. Each returns a
+# (status_code, body) tuple where body is a JSON-serializable object or
+# pre-encoded bytes.
+
+def _route_options(query):
+    return 200, _options_cache.view('options', _build_options_view)
+
+
+def _route_access_key(query):
+    return 200, _options_cache.view('access_key', _build_access_key_view)
+
+
+def _route_edition(query):
+    try:
+        return 200, _options_cache.view('edition', _build_edition_view)
+    except Exception as conf_error:
+        logging.debug(f"Error determining edition from pluggie.json: {conf_error}")
+        return 200, {"edition": "unknown"}
+
+
+def _route_status(query):
+    status = _read_state()
+    if status is None:
+        return 200, {"status": 'unknown', "connectivity_issue": False}
+
+    # Set flag if "connectivity_issue"
+    connectivity_issue = status == "connectivity_issue"
+    checked_at = None
+
+    # The monitor thread owns the apiserver check for "invalid_key"
+    if status == 'invalid_key':
+        connectivity_issue, checked_at = _connectivity_monitor.verdict()
+
+    return 200, {
+        "status": status,
+        "connectivity_issue": connectivity_issue,
+        "checked_at": checked_at
+    }
+
+
+def _route_health(query):
+    return 200, {"status": "ok"}
+
+
+def _route_traffic(query):
+    options = _options_cache.get()
+
+    access_key = options.get('configuration', {}).get('access_key')
+    if not access_key or access_key == 'XXXXX':
+        return 200, {
+            "status": "error",
+            "message": "No valid access key configured"
+        }
+
+    api_server = options.get('pluggie_config', {}).get('apiserver', 'api.pluggie.net')
+    return 200, _traffic_cache.get(
+        api_server,
+        access_key,
+        options.get('user_agent', 'Pluggie-HA-Addon'),
+        ttl=_traffic_cache_ttl(options),
+    )
+
+
+def _route_proxy_check(query):
+    result = _proxy_prober.snapshot()
+    if result is None:
+        # First probe still running (e.g. right after startup)
+        _proxy_prober.wait_first_probe(PROXY_FIRST_PROBE_WAIT)
+        result = _proxy_prober.snapshot()
+    if result is None:
+        return 200, {
+            "status": "pending",
+            "message": "Proxied host check has not completed yet",
+            "check_performed": False
+        }
+    return 200, result
+
+
+def _route_cert_verify(query):
+    return 200, get_last_result()
+
+
+def _route_cert_verify_refresh(query):
+    # Runs on the verification thread; poll /cert-verify/job or wait for
+    # the cert_verify event.
+    return 202, request_verification()
+
+
+def _route_cert_verify_job(query):
+    job_id = query.get('id', [''])[0]
+    job = get_job(job_id)
+    if job is None:
+        return 404, {"error": "Unknown job id"}
+    return 200, job
+
+
+def _route_jobs(query):
+    job_id = query.get('id', [''])[0]
+    if not job_id:
+        return 200, {"jobs": _job_queue.list()}
+    job = _job_queue.get(job_id)
+    if job is None:
+        return 404, {"error": "Unknown job id"}
+    return 200, job
+
+
+def _route_metrics(query):
+    return 200, REGISTRY.render().encode()
+
+
+# Sections of /pluggie/api/dashboard: (name, route handler, timeout).
+# The access key is deliberately left out; the UI fetches it on demand.
+_DASHBOARD_SECTIONS = (
+    ('edition', _route_edition, DASHBOARD_LOCAL_TIMEOUT),
+    ('health', _route_health, DASHBOARD_LOCAL_TIMEOUT),
+    ('status', _route_status, DASHBOARD_LOCAL_TIMEOUT),
+    ('options', _route_options, DASHBOARD_LOCAL_TIMEOUT),
+    ('cert_verify', _route_cert_verify, DASHBOARD_LOCAL_TIMEOUT),
+    ('traffic', _route_traffic, DASHBOARD_REMOTE_TIMEOUT),
+    ('proxy_check', _route_proxy_check, DASHBOARD_REMOTE_TIMEOUT),
+)
+
+_dashboard_executor = ThreadPoolExecutor(
+    max_workers=DASHBOARD_WORKERS, thread_name_prefix='api-dashboard')
+
+
+def _route_dashboard(query):
+    """
+    Aggregate the panel's startup requests into one response.
+
+    Sections are computed concurrently. Each one is reported as
+    {"state": "ready", "data": ...}, {"state": "error", "error": ...} or,
+    when it misses its timeout, {"state": "pending"} so the UI can fetch
+    it separately. Section bodies that are already serialized are
+    embedded without re-encoding.
+    """
+    started = time.monotonic()
+    futures = [
+        (name, _dashboard_executor.submit(handler, {}), timeout)
+        for name, handler, timeout in _DASHBOARD_SECTIONS
+    ]
+
+    parts = []
+    for name, future, timeout in futures:
+        remaining = max(0, started + timeout - time.monotonic())
+        wait([future], timeout=remaining)
+
+        if not future.done():
+            section = b'{"state": "pending"}'
+        elif future.exception() is not None:
+            logging.error(f"Error in dashboard section {name}: {future.exception()}")
+            section = json.dumps({
+                "state": "error",
+                "error": str(future.exception())
+            }).encode()
+        else:
+            _, body = future.result()
+            if not isinstance(body, bytes):
+                body = json.dumps(body).encode()
+            section = b'{"state": "ready", "data": ' + body + b'}'
+
+        parts.append(json.dumps(name).encode() + b': ' + section)
+
+    return 200, b'{' + b', '.join(parts) + b'}'
+
+
+def _apply_steps():
+    return [Step("apply_config", "/usr/local/bin/apply_config.sh",
+                 timeout=APPLY_TIMEOUT)]
+
+
+def _write_restart_reason():
+    with open("/tmp/restart_reason", "w") as f:
+        f.write("access_key_changed")
+
+
+def _restart_steps():
+    """
+    Container scripts re-run after an access key change.
+
+    The steps form a dependency graph: the letsencrypt folder setup runs
+    alongside stop/start/config. Once the tunnel (connector1) is up the
+    letsencrypt service runs, then the status service is restarted. The
+    end of the connector1 step is the time to tunnel-up.
+    """
+    return [
+        Step("restart_reason", _write_restart_reason),
+        Step("001-stop", "/etc/cont-finish.d/001-stop.sh",
+             requires=("restart_reason",), timeout=RESTART_STEP_TIMEOUT),
+        Step("001-start", "/etc/cont-init.d/001-start.sh",
+             requires=("001-stop",), timeout=RESTART_STEP_TIMEOUT),
+        # Waits for the apiserver with backoff, as at boot, so the
+        # timeout covers several attempts at the maximum retry delay
+        Step("005-config", "/etc/cont-init.d/005-config.sh",
+             requires=("001-start",), timeout=CONFIG_STEP_TIMEOUT),
+        Step("010-letsencrypt", "/etc/cont-init.d/010-letsencrypt.sh",
+             timeout=RESTART_STEP_TIMEOUT),
+        # Sleeps forever when the key is invalid, hence the timeout
+        Step("connector1", "/etc/services.d/connector1/run",
+             requires=("005-config",), timeout=RESTART_STEP_TIMEOUT),
+        Step("letsencrypt", "/etc/services.d/letsencrypt/run",
+             requires=("connector1", "010-letsencrypt"),
+             timeout=LETSENCRYPT_TIMEOUT, on_timeout="detach"),
+        # After letsencrypt: the status cycle (check_and_restart_wg.sh)
+        # may restart nginx or the tunnel while certbot is working
+        Step("status", "s6-svc -r /var/run/s6/legacy-services/status",
+             requires=("connector1", "letsencrypt"),
+             timeout=RESTART_STEP_TIMEOUT),
+    ]
+
+
+def _publish_job_result(job):
+    _event_bus.publish('apply', {
+        "kind": job["kind"],
+        "job_id": job["id"],
+        "exit_code": job["exit_code"],
+        "duration": job["duration"],
+    })
+
+
+# Applies and restarts run one at a time; a restart replaces a queued
+# apply since it regenerates everything the apply would
+_job_queue = JobQueue(supersedes={'restart': ('apply',)})
+_job_queue.add_listener(_publish_job_result)
+
+
+def _route_post_options(query, body):
+    raw_options = json.loads(body.decode('utf-8'))
+
+    delay_apply = (
+        raw_options.pop('delay_apply', False)
+        if isinstance(raw_options, dict) else False
+    )
+    options = _sanitize_options(raw_options)
+
+    # Validate proxied_host if present
+    if 'proxied_host' in options and options['proxied_host']:
+        is_valid, error_message = validate_url(options['proxied_host'])
+        if not is_valid:
+            return 200, {
+                "status": "error",
+                "message": error_message,
+                "field": "proxied_host"
+            }
+
+    with _options_lock:
+        # Read the existing file to ensure we keep the structure
+        with open(OPTIONS_FILE, 'r') as f:
+            current_options = json.load(f)
+
+        # Check if access_key is changing
+        access_key_changed = False
+        if 'configuration' in options and 'access_key' in options['configuration']:
+            new_access_key = options['configuration']['access_key']
+            current_access_key = current_options.get('configuration', {}).get('access_key')
+            if current_access_key != new_access_key and new_access_key != "XXXXX":
+                access_key_changed = True
+                logging.debug("Access key has changed, will restart container")
+            else:
+                access_key_changed = False
+                logging.debug("Access key unchanged or set to default, no restart needed")
+
+        # Update with new values
+        for key in options:
+            if key in current_options:
+                if isinstance(current_options[key], dict) and isinstance(options[key], dict):
+                    current_options[key].update(options[key])
+                else:
+                    current_options[key] = options[key]
+            else:
+                current_options[key] = options[key]
+
+        # Write back the updated options (temp file + rename, so readers
+        # never see a partially written file)
+        atomic_file.write_json(OPTIONS_FILE, current_options, indent=2)
+        _options_cache.invalidate()
+
+    response = {"status": "success"}
+
+    if access_key_changed:
+        response["message"] = "Access key updated, container will restart. Please wait."
+        logging.info("Starting service restart process")
+        job = _job_queue.submit('restart', _restart_steps, delay=RESTART_DELAY)
+        response["job_id"] = job["id"]
+    elif not delay_apply:
+        job = _job_queue.submit(
+            'apply', _apply_steps,
+            delay=APPLY_DEBOUNCE, max_delay=APPLY_MAX_DELAY)
+        response["job_id"] = job["id"]
+
+    return 200, response
+
+
+class Route:
+    """An admin API endpoint: metrics label, handler and content type."""
+
+    def __init__(self, name, handler, content_type='application/json'):
+        self.name = name
+        self.handler = handler
+        self.content_type = content_type
+
+
+_GET_ROUTES = {
+    '/pluggie/api/options': Route('options', _route_options),
+    '/pluggie/api/access-key': Route('access-key', _route_access_key),
+    '/pluggie/api/edition': Route('edition', _route_edition),
+    '/pluggie/api/status': Route('status', _route_status),
+    '/pluggie/api/health': Route('health', _route_health),
+    '/pluggie/api/traffic': Route('traffic', _route_traffic),
+    '/pluggie/api/proxy-check': Route('proxy-check', _route_proxy_check),
+    '/pluggie/api/cert-verify': Route('cert-verify', _route_cert_verify),
+    '/pluggie/api/cert-verify/refresh': Route(
+        'cert-verify-refresh', _route_cert_verify_refresh),
+    '/pluggie/api/cert-verify/job': Route(
+        'cert-verify-job', _route_cert_verify_job),
+    '/pluggie/api/dashboard': Route('dashboard', _route_dashboard),
+    '/pluggie/api/jobs': Route('jobs', _route_jobs),
+    '/pluggie/api/metrics': Route(
+        'metrics', _route_metrics, content_type=METRICS_CONTENT_TYPE),
+}
+
+_POST_ROUTES = {
+    '/pluggie/api/options': Route('options', _route_post_options),
+}
+
+
 class AdminAPIHandler(BaseHTTPRequestHandler):
+    # Socket timeout so a stalled client cannot pin a pool worker forever
+    timeout = 30
+
     def log_message(self, format, *args):
         current_level = logging.getLogger().getEffectiveLevel()
 
@@ -127,358 +1274,166 @@ class AdminAPIHandler(BaseHTTPRequestHandler):
         self.end_headers()
 
 
+    def _accepts_gzip(self):
+        for coding in self.headers.get('Accept-Encoding', '').split(','):
+            name, _, params = coding.strip().partition(';')
+            if name.strip().lower() == 'gzip':
+                return params.replace(' ', '') not in ('q=0', 'q=0.0')
+        return False
+
+
+    def _etag_matches(self, digest):
+        # Either coding of the same content counts as a match: the client
+        # may have cached the identity version and now accept gzip.
+        if_none_match = self.headers.get('If-None-Match')
+        if not if_none_match:
+            return False
+        tags = ('*', f'"{digest}"', f'"{digest}-gzip"')
+        for candidate in if_none_match.split(','):
+            candidate = candidate.strip()
+            if candidate.startswith('W/'):
+                candidate = candidate[2:]
+            if candidate in tags:
+                return True
+        return False
+
+
+    def _send_body(self, status_code, body, content_type='application/json'):
+        """
+        Send a complete response.
+
+        Successful responses carry a content-hash ETag and are answered
+        with 304 when the client already has that version. Bodies are
+        gzip-compressed when the client accepts it; the gzip version gets
+        its own ETag (suffix "-gzip"), as strong validators must differ
+        per content-coding.
+        """
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+
+        content_encoding = None
+        if len(body) >= GZIP_MIN_LENGTH and self._accepts_gzip():
+            content_encoding = 'gzip'
+
+        etag = None
+        if status_code == 200:
+            digest = hashlib.sha256(body).hexdigest()[:32]
+            if content_encoding:
+                etag = f'"{digest}-{content_encoding}"'
+            else:
+                etag = f'"{digest}"'
+            if self._etag_matches(digest):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Vary', 'Accept-Encoding')
+                self.end_headers()
+                return
+
+        if content_encoding:
+            body = gzip.compress(body, compresslevel=5)
+
+        self.send_response(status_code)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        if content_encoding:
+            self.send_header('Content-Encoding', content_encoding)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def _dispatch(self, routes, method):
+        """Look up the route for self.path, run it and send its response."""
+        path, _, query_string = self.path.partition('?')
+        route = routes.get(path)
+        if route is None:
+            try:
+                self.send_response(404)
+                self.end_headers()
+            except BrokenPipeError:
+                logging.warning("Broken pipe error while sending 404 response")
+            REGISTRY.inc("pluggie_admin_requests_total", {
+                "route": "unknown", "method": method, "status": "404"})
+            return
+
+        labels = {"route": route.name}
+        status_code = 500
+        REGISTRY.inc("pluggie_admin_requests_in_flight", labels)
+        started = time.monotonic()
+        try:
+            query = urllib.parse.parse_qs(query_string)
+            if method == 'POST':
+                content_length = int(self.headers['Content-Length'])
+                status_code, body = route.handler(
+                    query, self.rfile.read(content_length))
+            else:
+                status_code, body = route.handler(query)
+            self._send_body(status_code, body, route.content_type)
+        except BrokenPipeError:
+            logging.warning(f"Broken pipe error when serving {route.name}")
+        except Exception as e:
+            status_code = 500
+            logging.error(f"Error in {route.name} endpoint: {e}")
+            try:
+                self._send_body(500, {"error": str(e)})
+            except BrokenPipeError:
+                logging.warning("Broken pipe error while sending error response")
+        finally:
+            REGISTRY.dec("pluggie_admin_requests_in_flight", labels)
+            REGISTRY.observe(
+                "pluggie_admin_request_duration_seconds",
+                time.monotonic() - started, labels)
+            REGISTRY.inc("pluggie_admin_requests_total", {
+                "route": route.name, "method": method,
+                "status": str(status_code)})
+
+
     def do_OPTIONS(self):
         self.send_response(405)
         self.send_header('Allow', 'GET, POST, HEAD')
         self.end_headers()
 
 
-    def do_GET(self):
+    def _serve_events(self):
+        """Stream bus events to the client until it disconnects."""
+        subscriber = _event_bus.subscribe()
+        REGISTRY.inc("pluggie_admin_event_streams")
         try:
-            if self.path == '/pluggie/api/options':
-                try:
-                    with open(OPTIONS_FILE, 'r') as f:
-                        options = json.load(f)
-
-                    # Strip the bearer credential from the bulk options dump.
-                    # Front-end fetches the raw value on demand via /pluggie/api/access-key.
-                    configuration = options.get('configuration')
-                    if isinstance(configuration, dict):
-                        access_key = configuration.get('access_key')
-                        configuration.pop('access_key', None)
-                        configuration['access_key_set'] = bool(
-                            access_key and access_key != 'XXXXX'
-                        )
-
-                    self._set_headers()
-                    self.wfile.write(json.dumps(options).encode())
-                except BrokenPipeError:
-                    logging.warning("Broken pipe error when returning options")
-                    return
-                except Exception as e:
-                    logging.error(f"Error reading options: {e}")
-                    try:
-                        self.send_response(500)
-                        self.end_headers()
-                        self.wfile.write(json.dumps({"error": str(e)}).encode())
-                    except BrokenPipeError:
-                        logging.warning("Broken pipe error while sending error response")
-                        return
-
-            elif self.path == '/pluggie/api/access-key':
-                try:
-                    with open(OPTIONS_FILE, 'r') as f:
-                        options = json.load(f)
-                    access_key = options.get('configuration', {}).get('access_key')
-                    self._set_headers()
-                    self.wfile.write(json.dumps({
-                        "access_key": access_key or "",
-                        "access_key_set": bool(access_key and access_key != 'XXXXX')
-                    }).encode())
-                except BrokenPipeError:
-                    logging.warning("Broken pipe error when returning access key")
-                    return
-                except Exception as e:
-                    logging.error(f"Error reading access key: {e}")
-                    try:
-                        self.send_response(500)
-                        self.end_headers()
-                        self.wfile.write(json.dumps({"error": str(e)}).encode())
-                    except BrokenPipeError:
-                        logging.warning("Broken pipe error while sending error response")
-                        return
-
-            elif self.path == '/pluggie/api/edition':
-                try:
-                    edition = "unknown"
-                    try:
-                        with open(OPTIONS_FILE, 'r') as f:
-                            options = json.load(f)
-                            user_agent = options.get('user_agent', '')
-                            if "Docker" in user_agent:
-                                edition = "docker"
-                            elif "HA" in user_agent:
-                                edition = "ha"
-                    except Exception as conf_error:
-                        logging.debug(f"Error determining edition from pluggie.json: {conf_error}")
-
-                    self._set_headers()
-                    self.wfile.write(json.dumps({"edition": edition}).encode())
-                except BrokenPipeError:
-                    logging.warning("Broken pipe error when returning edition")
-                    return
-                except Exception as e:
-                    logging.error(f"Error determining edition: {e}")
-                    try:
-                        self.send_response(500)
-                        self.end_headers()
-                        self.wfile.write(json.dumps({"error": str(e)}).encode())
-                    except BrokenPipeError:
-                        logging.warning("Broken pipe error while sending error response")
-                        return
-
-            elif self.path == '/pluggie/api/status':
-                try:
-                    status = 'unknown'
-                    connectivity_issue = False
-
-                    if os.path.exists('/etc/pluggie.state'):
-                        with open('/etc/pluggie.state', 'r') as f:
-                            status = f.read().strip()
-
-                        # Set flag if "connectivity_issue"
-                        if status == "connectivity_issue":
-                            connectivity_issue = True
-
-                        # Check connectivity issue if "invalid_key"
-                        if status == 'invalid_key':
-                            access_key = None
-                            with open(OPTIONS_FILE, 'r') as f:
-                                options = json.load(f)
-                                access_key = options.get('configuration', {}).get('access_key')
-
-                            if access_key == "XXXXX" or not access_key:
-                                connectivity_issue = False
-                                status = 'invalid_key'
-                            elif access_key and len(access_key) > 10:
-                                connectivity_issue = False
-                            else:
-                                try:
-                                    api_server = options.get('pluggie_config', {}).get('apiserver', 'api.pluggie.net')
-                                    test_url = f"https://{api_server}/health"
-                                    response = requests.head(test_url, timeout=3)
-
-                                    if response.status_code != 200:
-                                        connectivity_issue = True
-                                        logging.debug(f"API connectivity check failed: Status code {response.status_code}")
-                                except Exception as e:
-                                    if access_key != "XXXXX" and access_key:
-                                        connectivity_issue = True
-                                        with open('/etc/pluggie.state', 'w') as f:
-                                            f.write('connectivity_issue')
-                                        status = 'connectivity_issue'
-                                    logging.debug(f"API connectivity check failed: {e}")
-
-                    self._set_headers()
-                    self.wfile.write(json.dumps({
-                        "status": status,
-                        "connectivity_issue": connectivity_issue
-                    }).encode())
-                except BrokenPipeError:
-                    logging.warning("Broken pipe error when returning status")
-                    return
-                except Exception as e:
-                    logging.error(f"Error reading Pluggie status: {e}")
-                    try:
-                        self.send_response(500)
-                        self.end_headers()
-                        self.wfile.write(json.dumps({"error": str(e)}).encode())
-                    except BrokenPipeError:
-                        logging.warning("Broken pipe error while sending error response")
-                        return
-
-            elif self.path == '/pluggie/api/health':
+            self.send_response(200)
+            self.send_header('Content-type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            # Tell nginx not to buffer the stream
+            self.send_header('X-Accel-Buffering', 'no')
+            self.end_headers()
+            self.wfile.write(b'retry: 5000\n\n')
+
+            while True:
                 try:
-                    self._set_headers()
-                    self.wfile.write(json.dumps({"status": "ok"}).encode())
-                except BrokenPipeError:
-                    logging.warning("Broken pipe error when returning health status")
-                    return
-                except Exception as e:
-                    logging.error(f"Error in health check: {e}")
-                    try:
-                        self.send_response(500)
-                        self.end_headers()
-                        self.wfile.write(json.dumps({"error": str(e)}).encode())
-                    except BrokenPipeError:
-                        logging.warning("Broken pipe error while sending error response")
-                        return
-
-            elif self.path == '/pluggie/api/traffic':
-                try:
-                    with open(OPTIONS_FILE, 'r') as f:
-                        options = json.load(f)
-
-                    access_key = options.get('configuration', {}).get('access_key')
-                    if not access_key or access_key == 'XXXXX':
-                        self._set_headers()
-                        self.wfile.write(json.dumps({
-                            "status": "error",
-                            "message": "No valid access key configured"
-                        }).encode())
-                        return
-
-                    api_server = options.get('pluggie_config', {}).get('apiserver', 'api.pluggie.net')
-                    api_url = f"https://{api_server}/api/traffic"
-                    headers = {
-                        'Authorization': f'Bearer {access_key}',
-                        'User-Agent': options.get('user_agent', 'Pluggie-HA-Addon')
-                    }
-
-                    response = requests.get(api_url, headers=headers, timeout=10)
-
-                    if response.status_code == 200:
-                        traffic_data = response.json()
-                        self._set_headers()
-                        self.wfile.write(json.dumps(traffic_data).encode())
-                    else:
-                        self._set_headers()
-                        self.wfile.write(json.dumps({
-                            "status": "error",
-                            "message": "Traffic data unavailable"
-                        }).encode())
-
-                except requests.exceptions.RequestException as e:
-                    logging.debug(f"API connectivity error: {e}")
-                    self._set_headers()
-                    self.wfile.write(json.dumps({
-                        "status": "error",
-                        "message": "N/A at the moment"
-                    }).encode())
-                except Exception as e:
-                    logging.error(f"Error retrieving traffic data: {e}")
-                    try:
-                        self.send_response(500)
-                        self.end_headers()
-                        self.wfile.write(json.dumps({"error": str(e)}).encode())
-                    except BrokenPipeError:
-                        logging.warning("Broken pipe error while sending error response")
-                        return
-
-            elif self.path == '/pluggie/api/proxy-check':
-                try:
-                    with open(OPTIONS_FILE, 'r') as f:
-                        options = json.load(f)
-
-                    proxied_host = options.get('proxied_host', '')
-                    user_agent = options.get('user_agent', '')
-
-                    # Determine platform
-                    is_ha_addon = "HA" in user_agent
-
-                    # If no proxied_host configured, use default for HA addon
-                    if not proxied_host or proxied_host.strip() == '':
-                        if is_ha_addon:
-                            proxied_host = "http://homeassistant.local.hass.io:8123"
-                        else:
-                            # Docker without proxied_host - nothing to check
-                            self._set_headers()
-                            self.wfile.write(json.dumps({
-                                "status": "ok",
-                                "message": "No proxied host configured",
-                                "check_performed": False
-                            }).encode())
-                            return
-
-                    # Perform the check
-                    try:
-                        response = requests.get(
-                            proxied_host,
-                            timeout=5,
-                            allow_redirects=False,
-                            headers={
-                                'X-Forwarded-For': '127.0.0.1',
-                                'X-Forwarded-Proto': 'https'
-                            }
-                        )
-
-                        if response.status_code == 400:
-                            # 400 Bad Request - likely missing trusted_proxies
-                            self._set_headers()
-                            self.wfile.write(json.dumps({
-                                "status": "config_required",
-                                "message": "Proxied host returned 400 Bad Request. Configuration may be required.",
-                                "http_status": 400,
-                                "is_ha_addon": is_ha_addon,
-                                "check_performed": True
-                            }).encode())
-                        else:
-                            # Any other response means the connection works
-                            self._set_headers()
-                            self.wfile.write(json.dumps({
-                                "status": "ok",
-                                "message": "Proxied host is reachable",
-                                "http_status": response.status_code,
-                                "check_performed": True
-                            }).encode())
-
-                    except requests.exceptions.ConnectionError as e:
-                        # Connection refused or host unreachable
-                        logging.debug(f"Proxy check connection error: {e}")
-                        self._set_headers()
-                        self.wfile.write(json.dumps({
-                            "status": "connection_error",
-                            "message": "Cannot connect to proxied host",
-                            "check_performed": True
-                        }).encode())
-
-                    except requests.exceptions.Timeout:
-                        logging.debug("Proxy check timeout")
-                        self._set_headers()
-                        self.wfile.write(json.dumps({
-                            "status": "timeout",
-                            "message": "Connection to proxied host timed out",
-                            "check_performed": True
-                        }).encode())
-
-                except BrokenPipeError:
-                    logging.warning("Broken pipe error when checking proxy")
-                    return
-                except Exception as e:
-                    logging.error(f"Error checking proxy: {e}")
-                    try:
-                        self.send_response(500)
-                        self.end_headers()
-                        self.wfile.write(json.dumps({"error": str(e)}).encode())
-                    except BrokenPipeError:
-                        logging.warning("Broken pipe error while sending error response")
-                        return
-
-            elif self.path == '/pluggie/api/cert-verify':
-                try:
-                    result = get_last_result()
-                    self._set_headers()
-                    self.wfile.write(json.dumps(result).encode())
-                except BrokenPipeError:
-                    logging.warning("Broken pipe error when returning cert verify")
-                    return
-                except Exception as e:
-                    logging.error(f"Error in cert-verify endpoint: {e}")
-                    try:
-                        self.send_response(500)
-                        self.end_headers()
-                        self.wfile.write(json.dumps({"error": str(e)}).encode())
-                    except BrokenPipeError:
-                        logging.warning("Broken pipe error while sending error response")
-                        return
-
-            elif self.path == '/pluggie/api/cert-verify/refresh':
-                try:
-                    result = run_verification()
-                    from cert_verify import _save_result
-                    _save_result(result)
-                    self._set_headers()
-                    self.wfile.write(json.dumps(result).encode())
-                except BrokenPipeError:
-                    logging.warning("Broken pipe error when refreshing cert verify")
-                    return
-                except Exception as e:
-                    logging.error(f"Error in cert-verify refresh: {e}")
-                    try:
-                        self.send_response(500)
-                        self.end_headers()
-                        self.wfile.write(json.dumps({"error": str(e)}).encode())
-                    except BrokenPipeError:
-                        logging.warning("Broken pipe error while sending error response")
-                        return
+                    event_id, event, payload = subscriber.get(
+                        timeout=EVENT_KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    self.wfile.write(b': keepalive\n\n')
+                    continue
+                self.wfile.write(
+                    f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n".encode())
+        except OSError:
+            # Client went away (BrokenPipeError, ConnectionResetError, timeout)
+            logging.debug("Event stream closed")
+        finally:
+            _event_bus.unsubscribe(subscriber)
+            REGISTRY.dec("pluggie_admin_event_streams")
 
-            else:
-                try:
-                    self.send_response(404)
-                    self.end_headers()
-                except BrokenPipeError:
-                    logging.warning("Broken pipe error while sending 404 response")
-                    return
+
+    def do_GET(self):
+        try:
+            if self.path.partition('?')[0] == EVENTS_PATH:
+                self._serve_events()
+                return
+            self._dispatch(_GET_ROUTES, 'GET')
         except BrokenPipeError:
             logging.warning("Broken pipe error in do_GET")
             return
@@ -489,136 +1444,7 @@ class AdminAPIHandler(BaseHTTPRequestHandler):
 
     def do_POST(self):
         try:
-            if self.path == '/pluggie/api/options':
-                try:
-                    content_length = int(self.headers['Content-Length'])
-                    post_data = self.rfile.read(content_length)
-                    raw_options = json.loads(post_data.decode('utf-8'))
-
-                    delay_apply = (
-                        raw_options.pop('delay_apply', False)
-                        if isinstance(raw_options, dict) else False
-                    )
-                    options = _sanitize_options(raw_options)
-
-                    # Validate proxied_host if present
-                    if 'proxied_host' in options and options['proxied_host']:
-                        is_valid, error_message = validate_url(options['proxied_host'])
-                        if not is_valid:
-                            self._set_headers()
-                            self.wfile.write(json.dumps({
-                                "status": "error",
-                                "message": error_message,
-                                "field": "proxied_host"
-                            }).encode())
-                            return
-
-                    # Read the existing file to ensure we keep the structure
-                    with open(OPTIONS_FILE, 'r') as f:
-                        current_options = json.load(f)
-
-                    # Check if access_key is changing
-                    access_key_changed = False
-                    if 'configuration' in options and 'access_key' in options['configuration']:
-                        new_access_key = options['configuration']['access_key']
-                        current_access_key = current_options.get('configuration', {}).get('access_key')
-                        if current_access_key != new_access_key and new_access_key != "XXXXX":
-                            access_key_changed = True
-                            logging.debug("Access key has changed, will restart container")
-                        else:
-                            access_key_changed = False
-                            logging.debug("Access key unchanged or set to default, no restart needed")
-
-                    # Update with new values
-                    for key in options:
-                        if key in current_options:
-                            if isinstance(current_options[key], dict) and isinstance(options[key], dict):
-                                current_options[key].update(options[key])
-                            else:
-                                current_options[key] = options[key]
-                        else:
-                            current_options[key] = options[key]
-
-                    # Write back the updated options
-                    with open(OPTIONS_FILE, 'w') as f:
-                        json.dump(current_options, f, indent=2)
-
-                    self._set_headers()
-                    response = {"status": "success"}
-
-                    if access_key_changed:
-                        response["message"] = "Access key updated, container will restart. Please wait."
-
-                    self.wfile.write(json.dumps(response).encode())
-
-                    if not delay_apply and not access_key_changed:
-                        import threading
-
-                        def apply_config_process():
-                            try:
-                                result = os.system("/usr/local/bin/apply_config.sh")
-                            except Exception as e:
-                                logging.error(f"Error applying configuration: {e}")
-
-                        thread = threading.Thread(target=apply_config_process)
-                        thread.daemon = True
-                        thread.start()
-                    elif access_key_changed:
-                        import threading
-
-                        def restart_process():
-                            time.sleep(0.5)
-
-                            try:
-                                logging.info("Starting service restart process")
-                                with open("/tmp/restart_reason", "w") as f:
-                                    f.write("access_key_changed")
-
-                                scripts = [
-                                    "/etc/cont-finish.d/001-stop.sh",
-                                    "/etc/cont-init.d/001-start.sh",
-                                    "/etc/cont-init.d/005-config.sh",
-                                    "/etc/cont-init.d/010-letsencrypt.sh",
-                                    "/etc/services.d/connector1/run",
-                                    "/etc/services.d/letsencrypt/run",
-                                    "s6-svc -r /var/run/s6/legacy-services/status"
-                                ]
-
-                                for script in scripts:
-                                    logging.debug(f"Executing script: {script}")
-                                    return_code = os.system(script)
-
-                                    if return_code != 0:
-                                        logging.error(f"Script {script} failed with return code {return_code}")
-                                    else:
-                                        logging.debug(f"Script {script} completed successfully")
-                            except Exception as e:
-                                logging.error(f"Error during restart: {e}")
-
-                        thread = threading.Thread(target=restart_process)
-                        thread.daemon = True
-                        thread.start()
-
-                except BrokenPipeError as e:
-                    logging.warning(f"Broken pipe error (expected during restarts): {e}")
-                    return
-                except Exception as e:
-                    logging.error(f"Error updating options: {e}")
-                    try:
-                        self.send_response(500)
-                        self.end_headers()
-                        self.wfile.write(json.dumps({"error": str(e)}).encode())
-                    except BrokenPipeError:
-                        logging.warning("Broken pipe error while sending error response")
-                        return
-
-            else:
-                try:
-                    self.send_response(404)
-                    self.end_headers()
-                except BrokenPipeError:
-                    logging.warning("Broken pipe error while sending 404 response")
-                    return
+            self._dispatch(_POST_ROUTES, 'POST')
         except BrokenPipeError:
             logging.warning("Broken pipe error in do_POST")
             return
@@ -642,14 +1468,129 @@ class AdminAPIHandler(BaseHTTPRequestHandler):
             return
 
 
-def run(server_class=HTTPServer, handler_class=AdminAPIHandler, port=8000):
+def _peek_request_path(request):
+    """
+    Return the path from the request line without consuming it.
+
+    Args:
+        request: Accepted client socket.
+
+    Returns:
+        str: Request path without query string, or '' if the complete
+             request line has not arrived within REQUEST_PEEK_TIMEOUT.
+    """
+    try:
+        request.settimeout(REQUEST_PEEK_TIMEOUT)
+        head = request.recv(1024, socket.MSG_PEEK)
+    except OSError:
+        return ''
+    finally:
+        try:
+            request.settimeout(None)
+        except OSError:
+            pass
+
+    if b'\r\n' not in head:
+        return ''
+    parts = head.split(b'\r\n', 1)[0].split(b' ')
+    if len(parts) < 2:
+        return ''
+    return parts[1].decode('latin-1').split('?', 1)[0]
+
+
+class LaneHTTPServer(HTTPServer):
+    """
+    HTTPServer that handles requests on bounded worker pools.
+
+    The accept thread peeks at the request line and picks the lane.
+    Requests for endpoints in _SLOW_LANE_PATHS go to the slow lane so that
+    outbound calls cannot starve health checks and other local endpoints,
+    and so do connections that are slow to send their request line, so
+    idle clients cannot tie up fast-lane workers. Event streams run on
+    dedicated threads, up to EVENT_STREAM_LIMIT.
+    """
+
+    def __init__(self, server_address, handler_class,
+                 fast_workers=FAST_LANE_WORKERS,
+                 slow_workers=SLOW_LANE_WORKERS):
+        # Pools must exist before binding: a bind failure calls server_close()
+        self._fast_lane = ThreadPoolExecutor(
+            max_workers=fast_workers, thread_name_prefix='api-fast')
+        self._slow_lane = ThreadPoolExecutor(
+            max_workers=slow_workers, thread_name_prefix='api-slow')
+        self._stream_slots = threading.BoundedSemaphore(EVENT_STREAM_LIMIT)
+        super().__init__(server_address, handler_class)
+
+    def process_request(self, request, client_address):
+        path = _peek_request_path(request)
+        if path == EVENTS_PATH:
+            self._start_stream(request, client_address)
+        elif not path or path in _SLOW_LANE_PATHS:
+            self._slow_lane.submit(self._serve, request, client_address)
+        else:
+            self._fast_lane.submit(self._serve, request, client_address)
+
+    def _start_stream(self, request, client_address):
+        if not self._stream_slots.acquire(blocking=False):
+            logging.warning("Too many event streams, rejecting connection")
+            try:
+                request.sendall(
+                    b'HTTP/1.0 503 Service Unavailable\r\n'
+                    b'Retry-After: 30\r\nContent-Length: 0\r\n\r\n')
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+
+        def serve_stream():
+            try:
+                self._serve(request, client_address)
+            finally:
+                self._stream_slots.release()
+
+        thread = threading.Thread(target=serve_stream, daemon=True)
+        thread.name = "api-events"
+        thread.start()
+
+    def _serve(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._fast_lane.shutdown(wait=False)
+        self._slow_lane.shutdown(wait=False)
+
+
+def run(server_class=LaneHTTPServer, handler_class=AdminAPIHandler, port=8000):
     server_address = ('', port)
     httpd = server_class(server_address, handler_class)
     logging.debug(f'Starting admin server on port {port}...')
 
     # Start certificate verification background thread
+    add_result_listener(
+        lambda result: _event_bus.publish('cert_verify', result))
     start_verification_thread()
 
+    # Push state and options changes to event streams
+    watcher = threading.Thread(target=_watch_files, daemon=True)
+    watcher.name = "file-watch"
+    watcher.start()
+
+    # Check the proxied host in the background for /proxy-check
+    prober = threading.Thread(target=_proxy_prober.run, daemon=True)
+    prober.name = "proxy-probe"
+    prober.start()
+
+    # Check apiserver reachability in the background for /status
+    monitor = threading.Thread(target=_connectivity_monitor.run, daemon=True)
+    monitor.name = "connectivity-monitor"
+    monitor.start()
+
     httpd.serve_forever()
 
 
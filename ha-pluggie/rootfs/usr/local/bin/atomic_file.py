@@ -0,0 +1,64 @@
+#!/usr/local/bin/python
+"""
+Atomic file writes for Pluggie Python scripts.
+
+Content is written to a temporary file in the target directory, flushed
+to disk and renamed over the target, so concurrent readers (shell
+scripts, the admin API) see either the old or the new file, never a
+partially written one.
+"""
+
+import json
+import os
+import tempfile
+
+
+def write_bytes(path, data, mode=None):
+    """
+    Atomically replace *path* with *data*.
+
+    Unless *mode* is given, the permissions of an existing file are
+    preserved. Symlinks are followed, so the link itself stays in place
+    (e.g. /data/pluggie.json -> /ssl/pluggie/pluggie.json).
+
+    Args:
+        path: Target file path.
+        data: Content as bytes.
+        mode: Permission bits for the new file (e.g. 0o600).
+    """
+    path = os.path.realpath(path)
+    directory = os.path.dirname(path)
+    if mode is None:
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = 0o644
+
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_json(path, data, mode=None, **kwargs):
+    """
+    Atomically replace *path* with *data* serialized as JSON.
+
+    Args:
+        path:   Target file path.
+        data:   JSON-serializable object.
+        mode:   Permission bits for the new file, see write_bytes().
+        kwargs: Passed to json.dumps() (e.g. indent).
+    """
+    write_bytes(path, json.dumps(data, **kwargs).encode('utf-8'), mode)
@@ -0,0 +1,40 @@
+#!/bin/bash
+# ==============================================================================
+# Prepares the admin interface assets at image build time:
+# - copies images referenced by index.html to content-hashed file names and
+#   rewrites the references, so nginx can serve them as immutable
+# - writes precompressed .gz and .br variants of the text assets for
+#   gzip_static / brotli_static
+# ==============================================================================
+
+set -euo pipefail
+
+WWW_DIR=${1:-/usr/local/www}
+
+# Assets referenced by index.html that get a content-hashed copy.
+# The original files stay in place for 400.html.
+HASHED_ASSETS=(favicon.png logo.png)
+
+# Text assets that are worth precompressing (images are already compressed)
+COMPRESS_PATTERN='.*\.\(html\|css\|js\|json\|svg\|txt\)$'
+
+cd "${WWW_DIR}"
+
+for asset in "${HASHED_ASSETS[@]}"; do
+    [ -f "${asset}" ] || continue
+    hash=$(sha256sum "${asset}" | cut -c1-12)
+    hashed="${asset%.*}.${hash}.${asset##*.}"
+    cp -p "${asset}" "${hashed}"
+    # Only rewrite quoted relative references (href="logo.png")
+    sed -i "s#\"${asset}\"#\"${hashed}\"#g" index.html
+    echo "${asset} -> ${hashed}"
+done
+
+find . -maxdepth 1 -type f -regex "${COMPRESS_PATTERN}" | while read -r file; do
+    gzip -9 -n -c "${file}" > "${file}.gz"
+    touch -r "${file}" "${file}.gz"
+    if command -v brotli >/dev/null 2>&1; then
+        brotli -q 11 -c "${file}" > "${file}.br"
+        touch -r "${file}" "${file}.br"
+    fi
+done
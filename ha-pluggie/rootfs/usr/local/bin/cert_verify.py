@@ -13,14 +13,15 @@ import hashlib
 import json
 import logging
 import os
+import queue
 import socket
-import ssl
-import subprocess
 import threading
 import time
+import uuid
+from collections import OrderedDict
 
-import requests
-
+import atomic_file
+import http_client
 from logger import get_logger
 
 OPTIONS_FILE = "/data/pluggie.json"
@@ -28,86 +29,241 @@ CERT_VERIFY_FILE = "/tmp/cert_verify.json"
 VERIFY_INTERVAL = 3600  # 1 hour
 INITIAL_DELAY = 120  # 2 minutes after startup
 TRIGGER_FILE = "/tmp/cert_verify_trigger"
+JOB_HISTORY = 20  # finished refresh jobs kept for polling
 
 _wakeup_event = threading.Event()
+_result_listeners = []
+
+# Refresh jobs requested via request_verification(), keyed by job id.
+# At most one job is queued and one running at any time.
+_jobs_lock = threading.Lock()
+_jobs = OrderedDict()
+_queued_job = None
+_running_job = None
+
+DOH_DEFAULT_RESOLVERS = (
+    "https://1.1.1.1/dns-query",
+    "https://8.8.8.8/dns-query",
+)
+DOH_TIMEOUT = 10  # per query; all resolvers are queried in parallel
+DOH_MAX_CNAME_DEPTH = 8
+# Bounds for caching answers by their TTL, in seconds
+DOH_MIN_TTL = 30
+DOH_MAX_TTL = 3600
+
+# Resolver settings from pluggie.json and cached answers:
+# name -> (expires_at, address), monotonic time
+_doh_lock = threading.Lock()
+_doh_config = {}
+_doh_cache = {}
+
+# Local certificate lookups, reused while the files are unchanged:
+# (live_dir, hostname) -> (live_dir identity, cert path) for numbered
+# certbot directories, cert path -> (file identity, fingerprint)
+_local_cert_lock = threading.Lock()
+_cert_path_cache = {}
+_fingerprint_cache = {}
+
+
+def _file_identity(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
 
 
 def _load_doh_resolvers():
     """
-    Load DoH resolver URLs from pluggie.json configuration.
+    Load the DoH settings from pluggie.json configuration.
 
-    Falls back to a sensible default list when the config key is absent.
+    pluggie_config.doh_resolvers lists the resolver URLs and falls back
+    to DOH_DEFAULT_RESOLVERS when absent.  pluggie_config.doh_agreement
+    is the number of resolvers that must return the same answer
+    (default 1: the first valid answer wins).  The parsed settings are
+    reused until pluggie.json changes.
 
     Returns:
-        A list of DoH server URL strings.
+        A (resolvers, agreement) tuple.
     """
-    default_resolvers = [
-        "https://1.1.1.1/dns-query",
-        "https://8.8.8.8/dns-query",
-    ]
+    identity = _file_identity(OPTIONS_FILE)
+    with _doh_lock:
+        if _doh_config.get("identity") == identity and identity is not None:
+            return _doh_config["resolvers"], _doh_config["agreement"]
+
+    resolvers, agreement = list(DOH_DEFAULT_RESOLVERS), 1
     try:
-        if os.path.isfile(OPTIONS_FILE):
+        if identity is not None:
             with open(OPTIONS_FILE, "r") as fh:
                 options = json.load(fh)
-            resolvers = options.get(
-                "pluggie_config", {},
-            ).get("doh_resolvers")
-            if isinstance(resolvers, list) and resolvers:
-                return resolvers
+            pluggie_config = options.get("pluggie_config", {})
+            configured = pluggie_config.get("doh_resolvers")
+            if isinstance(configured, list) and configured:
+                resolvers = configured
+            agreement = int(pluggie_config.get("doh_agreement", 1))
     except Exception as exc:
         logging.debug("Failed to load doh_resolvers from config: %s", exc)
-    return default_resolvers
 
+    agreement = max(1, min(agreement, len(resolvers)))
+    with _doh_lock:
+        _doh_config.update(
+            identity=identity, resolvers=resolvers, agreement=agreement,
+        )
+    return resolvers, agreement
 
-def _resolve_hostname_doh(hostname):
+
+def _query_doh(server, name):
     """
-    Resolve a hostname to an IPv4 address using DNS-over-HTTPS (DoH).
+    Send one DoH JSON query for the A records of *name*.
+
+    Returns:
+        An (addresses, cname, ttl) tuple with the A records in answer
+        order, the last CNAME target when there are no A records, and
+        the lowest TTL of the answer; or None if there is no usable
+        answer.
+    """
+    resp = http_client.get(
+        server,
+        params={"name": name, "type": "A"},
+        headers={"Accept": "application/dns-json"},
+        timeout=DOH_TIMEOUT,
+        dependency="doh",
+    )
+    if resp.status_code != 200:
+        return None
 
-    Resolver URLs are read from pluggie_config.doh_resolvers in
-    pluggie.json.  Falls back to Cloudflare + Google when the key is
-    not present.
+    answers = resp.json().get("Answer") or []
+    addresses = []
+    cname = None
+    for answer in answers:
+        data = answer.get("data")
+        if answer.get("type") == 1 and data:  # A record
+            if data not in addresses:
+                addresses.append(data)
+        elif answer.get("type") == 5 and data:  # CNAME
+            cname = data.rstrip(".")
+    if not addresses and not cname:
+        return None
 
-    Args:
-        hostname: The hostname to resolve.
+    ttl = min((int(answer.get("TTL", DOH_MIN_TTL)) for answer in answers),
+              default=DOH_MIN_TTL)
+    return addresses, None if addresses else cname, ttl
+
+
+def _resolve_doh_once(name, resolvers, agreement):
+    """
+    Query all *resolvers* for *name* concurrently.
+
+    With agreement 1 the first usable answer wins and the slower
+    queries are abandoned.  Otherwise an address (or CNAME target) is
+    only accepted once *agreement* resolvers returned it.
 
     Returns:
-        The resolved IPv4 address string, or None on failure.
+        An (addresses, cname, ttl) tuple as from _query_doh(), or None.
     """
-    doh_servers = _load_doh_resolvers()
+    results = queue.Queue()
 
-    for server in doh_servers:
+    def query(server):
         try:
-            resp = requests.get(
-                server,
-                params={"name": hostname, "type": "A"},
-                headers={"Accept": "application/dns-json"},
-                timeout=10,
-            )
-            if resp.status_code != 200:
-                continue
-
-            data = resp.json()
-            answers = data.get("Answer", [])
-            for answer in answers:
-                if answer.get("type") == 1:  # A record
-                    ip_addr = answer.get("data")
-                    if ip_addr:
-                        logging.debug(
-                            "DoH resolved %s -> %s via %s",
-                            hostname, ip_addr, server,
-                        )
-                        return ip_addr
-
-            # Handle CNAME chain - follow until we get an A record
-            for answer in answers:
-                if answer.get("type") == 5:  # CNAME
-                    cname_target = answer.get("data", "").rstrip(".")
-                    if cname_target:
-                        return _resolve_hostname_doh(cname_target)
-
+            answer = _query_doh(server, name)
         except Exception as exc:
             logging.debug("DoH resolution failed via %s: %s", server, exc)
+            answer = None
+        results.put((server, answer))
+
+    for server in resolvers:
+        threading.Thread(
+            target=query, args=(server,), name="doh-query", daemon=True,
+        ).start()
+
+    votes = {}
+    for _ in resolvers:
+        server, answer = results.get()
+        if answer is None:
             continue
+        addresses, cname, ttl = answer
+        if agreement <= 1:
+            logging.debug(
+                "DoH resolved %s -> %s via %s",
+                name, addresses or cname, server,
+            )
+            return answer
+
+        keys = [("A", address) for address in addresses] or [("CNAME", cname)]
+        for key in keys:
+            servers, lowest_ttl = votes.get(key, (set(), ttl))
+            servers.add(server)
+            votes[key] = (servers, min(lowest_ttl, ttl))
+            if len(servers) >= agreement:
+                logging.debug(
+                    "DoH resolved %s -> %s, confirmed by %d resolvers",
+                    name, key[1], len(servers),
+                )
+                if key[0] == "A":
+                    return [key[1]], None, votes[key][1]
+                return [], key[1], votes[key][1]
+
+    if votes:
+        logging.warning(
+            "DoH resolvers did not agree on %s (%d matching answers "
+            "required)", name, agreement,
+        )
+    return None
+
+
+def _resolve_hostname_doh(hostname):
+    """
+    Resolve a hostname to an IPv4 address using DNS-over-HTTPS (DoH).
+
+    All resolvers from _load_doh_resolvers() are queried concurrently.
+    CNAME chains the resolver did not flatten are followed up to
+    DOH_MAX_CNAME_DEPTH levels.  Answers are cached per name for their
+    TTL (clamped to DOH_MIN_TTL..DOH_MAX_TTL).
+
+    Args:
+        hostname: The hostname to resolve.
+
+    Returns:
+        The resolved IPv4 address string, or None on failure.
+    """
+    key = hostname.lower().rstrip(".")
+    now = time.monotonic()
+    with _doh_lock:
+        cached = _doh_cache.get(key)
+        if cached and cached[0] > now:
+            logging.debug("DoH cache hit for %s -> %s", hostname, cached[1])
+            return cached[1]
+
+    resolvers, agreement = _load_doh_resolvers()
+    chain = []
+    ttl = DOH_MAX_TTL
+    name = key
+    for _ in range(DOH_MAX_CNAME_DEPTH + 1):
+        answer = _resolve_doh_once(name, resolvers, agreement)
+        if answer is None:
+            break
+        addresses, cname, answer_ttl = answer
+        chain.append(name)
+        ttl = min(ttl, answer_ttl)
+        if addresses:
+            expires = time.monotonic() + max(DOH_MIN_TTL, ttl)
+            with _doh_lock:
+                for stale in [name for name, entry in _doh_cache.items()
+                              if entry[0] <= now]:
+                    del _doh_cache[stale]
+                for alias in chain:
+                    _doh_cache[alias] = (expires, addresses[0])
+            return addresses[0]
+        if cname in chain:
+            logging.warning("DoH CNAME loop for %s at %s", hostname, cname)
+            return None
+        name = cname
+    else:
+        logging.warning(
+            "DoH CNAME chain for %s longer than %d", hostname,
+            DOH_MAX_CNAME_DEPTH,
+        )
+        return None
 
     logging.warning("DoH resolution failed for %s on all servers", hostname)
     return None
@@ -126,6 +282,9 @@ def _get_remote_cert_fingerprint(hostname, ip_addr, port=443):
     Returns:
         A colon-separated SHA-256 fingerprint string, or None on error.
     """
+    # Imported here to keep the admin API startup light
+    import ssl
+
     try:
         ctx = ssl.create_default_context()
         # We only want the fingerprint - don't verify the chain here
@@ -160,13 +319,49 @@ def _get_remote_cert_fingerprint(hostname, ip_addr, port=443):
         return None
 
 
+def _find_numbered_cert(live_dir, hostname):
+    """
+    Return the cert.pem of a numbered certbot directory for *hostname*
+    (e.g. live/example.com-0001), or None.
+
+    A found path is reused until the live directory changes. "Not found"
+    is not cached: certbot can add cert.pem inside an existing numbered
+    directory without changing the live directory itself.
+    """
+    identity = _file_identity(live_dir)
+    if identity is None:
+        return None
+
+    key = (live_dir, hostname)
+    with _local_cert_lock:
+        cached = _cert_path_cache.get(key)
+    if cached and cached[0] == identity and os.path.isfile(cached[1]):
+        return cached[1]
+
+    cert_path = None
+    for entry in sorted(os.listdir(live_dir), reverse=True):
+        if entry.startswith(hostname):
+            candidate = os.path.join(live_dir, entry, "cert.pem")
+            if os.path.isfile(candidate):
+                cert_path = candidate
+                break
+
+    if cert_path is not None:
+        with _local_cert_lock:
+            _cert_path_cache[key] = (identity, cert_path)
+    return cert_path
+
+
 def _get_local_cert_fingerprint(hostname):
     """
     Read the local Let's Encrypt certificate and return its SHA-256
     fingerprint.
 
     The certificate path is derived from the standard certbot directory
-    layout under the Pluggie SSL directory.
+    layout under the Pluggie SSL directory.  The PEM is decoded
+    in-process, and the fingerprint is reused while the file (path,
+    device, inode, mtime, size) stays the same, so an unchanged
+    certificate costs a single stat.
 
     Args:
         hostname: The hostname whose certificate to read.
@@ -180,40 +375,35 @@ def _get_local_cert_fingerprint(hostname):
     else:
         pluggie_dir = "/data"
 
-    cert_path = os.path.join(
-        pluggie_dir, "letsencrypt", "live", hostname, "cert.pem",
-    )
+    live_dir = os.path.join(pluggie_dir, "letsencrypt", "live")
+    default_path = os.path.join(live_dir, hostname, "cert.pem")
 
-    if not os.path.isfile(cert_path):
+    cert_path = default_path
+    identity = _file_identity(cert_path)
+    if identity is None:
         # Certbot may use a numbered directory when certs are expanded
-        live_dir = os.path.join(pluggie_dir, "letsencrypt", "live")
-        if os.path.isdir(live_dir):
-            for entry in sorted(os.listdir(live_dir), reverse=True):
-                if entry.startswith(hostname):
-                    candidate = os.path.join(live_dir, entry, "cert.pem")
-                    if os.path.isfile(candidate):
-                        cert_path = candidate
-                        break
-
-    if not os.path.isfile(cert_path):
-        logging.warning("Local certificate not found at %s", cert_path)
+        cert_path = _find_numbered_cert(live_dir, hostname)
+        identity = _file_identity(cert_path) if cert_path else None
+
+    if identity is None:
+        logging.warning("Local certificate not found at %s", default_path)
         return None
 
+    with _local_cert_lock:
+        cached = _fingerprint_cache.get(cert_path)
+    if cached and cached[0] == identity:
+        return cached[1]
+
+    import ssl
+
     try:
-        # Convert PEM to DER for fingerprinting
-        result = subprocess.run(
-            ["openssl", "x509", "-in", cert_path, "-outform", "DER"],
-            capture_output=True,
-            timeout=10,
-        )
-        if result.returncode != 0:
-            logging.warning(
-                "openssl x509 failed: %s",
-                result.stderr.decode(errors="replace"),
-            )
-            return None
+        with open(cert_path, "r") as fh:
+            pem = fh.read()
+        # Only the first certificate, as `openssl x509` would read it
+        begin = pem.index(ssl.PEM_HEADER)
+        end = pem.index(ssl.PEM_FOOTER, begin) + len(ssl.PEM_FOOTER)
+        der_bytes = ssl.PEM_cert_to_DER_cert(pem[begin:end])
 
-        der_bytes = result.stdout
         sha256 = hashlib.sha256(der_bytes).hexdigest().upper()
         fingerprint = ":".join(
             sha256[i:i + 2] for i in range(0, len(sha256), 2)
@@ -221,20 +411,40 @@ def _get_local_cert_fingerprint(hostname):
         logging.debug(
             "Local cert fingerprint for %s: %s", hostname, fingerprint,
         )
-        return fingerprint
     except Exception as exc:
         logging.warning("Failed to read local certificate: %s", exc)
         return None
 
+    with _local_cert_lock:
+        _fingerprint_cache[cert_path] = (identity, fingerprint)
+    return fingerprint
+
+
+def add_result_listener(callback):
+    """
+    Register a callback invoked with every saved verification result.
+
+    Used by admin_api.py to push results to connected clients.
+
+    Args:
+        callback: Callable taking the result dict.
+    """
+    _result_listeners.append(callback)
+
 
 def _save_result(result):
     """Persist verification result to a JSON file for the API to read."""
     try:
-        with open(CERT_VERIFY_FILE, "w") as fh:
-            json.dump(result, fh, indent=2)
+        atomic_file.write_json(CERT_VERIFY_FILE, result, indent=2)
     except Exception as exc:
         logging.error("Failed to save cert verification result: %s", exc)
 
+    for callback in list(_result_listeners):
+        try:
+            callback(result)
+        except Exception as exc:
+            logging.debug("Cert verification listener failed: %s", exc)
+
 
 def run_verification():
     """
@@ -391,8 +601,9 @@ def _report_to_apiserver(result):
             "timestamp": result.get("timestamp"),
         }
 
-        resp = requests.post(
+        resp = http_client.post(
             api_url, headers=headers, json=payload, timeout=10,
+            dependency="apiserver",
         )
         logging.debug(
             "Cert verify reported to apiserver: %d", resp.status_code,
@@ -411,6 +622,84 @@ def trigger_verification():
     _wakeup_event.set()
 
 
+def request_verification():
+    """
+    Ask the verification loop for a fresh run and return its job.
+
+    Requests arriving while a job is queued or running join that job
+    instead of starting another run, so repeated refreshes cost one
+    verification.
+
+    Returns:
+        A copy of the job dict (id, status, requested_at, ...).
+    """
+    global _queued_job
+
+    with _jobs_lock:
+        job = _queued_job or _running_job
+        if job is None:
+            job = {
+                "id": uuid.uuid4().hex[:12],
+                "status": "queued",
+                "requested_at": time.strftime(
+                    "%Y-%m-%dT%H:%M:%SZ", time.gmtime(),
+                ),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+            }
+            _jobs[job["id"]] = job
+            while len(_jobs) > JOB_HISTORY:
+                _jobs.popitem(last=False)
+            _queued_job = job
+            # Only a new job wakes the loop; waking it for a request that
+            # joined the running job would cause a second, unasked run
+            _wakeup_event.set()
+        snapshot = dict(job)
+
+    return snapshot
+
+
+def get_job(job_id):
+    """
+    Return a copy of a refresh job, or None if it is unknown.
+
+    Args:
+        job_id: Id returned by request_verification().
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+
+def _start_queued_job():
+    """Move the queued job (if any) to running and return it."""
+    global _queued_job, _running_job
+
+    with _jobs_lock:
+        job = _queued_job
+        _queued_job = None
+        if job is not None:
+            job["status"] = "running"
+            job["started_at"] = time.strftime(
+                "%Y-%m-%dT%H:%M:%SZ", time.gmtime(),
+            )
+        _running_job = job
+        return job
+
+
+def _finish_job(job, result):
+    global _running_job
+
+    with _jobs_lock:
+        job["status"] = "finished"
+        job["finished_at"] = time.strftime(
+            "%Y-%m-%dT%H:%M:%SZ", time.gmtime(),
+        )
+        job["result"] = result
+        _running_job = None
+
+
 def verification_loop():
     """
     Background loop that runs verification periodically.
@@ -439,13 +728,20 @@ def verification_loop():
         except OSError:
             pass
 
+        job = _start_queued_job()
+        result = None
         try:
             result = run_verification()
+            if job is not None:
+                result["job_id"] = job["id"]
             _save_result(result)
         except Exception as exc:
             logging.error(
                 "Unexpected error in verification loop: %s", exc,
             )
+        finally:
+            if job is not None:
+                _finish_job(job, result)
 
         # Wait for next scheduled run, but wake early on event or
         # trigger file appearing on disk (checked every 10 s).
@@ -65,8 +65,9 @@ restart_wireguard() {
 }
 
 # Function to check certificate expiry and trigger renewal if needed.
-# Rate-limited to one attempt per 12 hours via /tmp/last_cert_renew_attempt
-# to avoid hammering ACME during outages or in tight loops.
+# Rate-limited by the cert_renewal retry policy (at least 12 hours between
+# attempts, backing off to 48 hours) to avoid hammering ACME during outages
+# or in tight loops.
 check_cert_renewal() {
     local user_agent
     user_agent=$(bashio::config 'user_agent')
@@ -79,8 +80,6 @@ check_cert_renewal() {
 
     local cert_path="${pluggie_dir}/letsencrypt/live/${PLUGGIE_HOSTNAME}/fullchain.pem"
     local renew_threshold_seconds=$((30 * 86400))
-    local rate_limit_file="/tmp/last_cert_renew_attempt"
-    local rate_limit_seconds=$((12 * 3600))
 
     if [ ! -f "${cert_path}" ]; then
         bashio::log.debug "No certificate at ${cert_path}, skipping renewal check."
@@ -89,30 +88,66 @@ check_cert_renewal() {
 
     if openssl x509 -in "${cert_path}" -noout -checkend "${renew_threshold_seconds}" >/dev/null 2>&1; then
         bashio::log.debug "Certificate is valid for more than 30 days, no renewal needed."
+        /usr/local/bin/retry_scheduler.py success cert_renewal >/dev/null || true
         return 0
     fi
 
     # Cert is within renewal window. Apply rate limit.
-    if [ -f "${rate_limit_file}" ]; then
-        local last_attempt
-        last_attempt=$(cat "${rate_limit_file}" 2>/dev/null || echo 0)
-        local now
-        now=$(date +%s)
-        local elapsed=$((now - last_attempt))
-        if [ "${elapsed}" -lt "${rate_limit_seconds}" ]; then
-            bashio::log.debug "Cert renewal attempted ${elapsed}s ago, waiting for rate limit (${rate_limit_seconds}s)."
-            return 0
-        fi
+    if ! /usr/local/bin/retry_scheduler.py due cert_renewal; then
+        bashio::log.debug "Cert renewal attempted recently, waiting for rate limit."
+        return 0
     fi
 
     bashio::log.debug "Certificate expires within 30 days. Triggering renewal."
-    date +%s > "${rate_limit_file}"
+    # Counts as failed until a later check finds the certificate renewed
+    /usr/local/bin/retry_scheduler.py failure cert_renewal >/dev/null || true
 
     # letsencrypt/run handles ACME failure gracefully (keeps existing cert) and
     # reloads nginx on success.
     /etc/services.d/letsencrypt/run
 }
 
+# Function to replace the saved settings the tunnel was brought up with
+# during an apiserver outage by the current ones, once the API answers
+reconcile_offline_snapshot() {
+    local ret=0
+    bashio::log.debug "Running on saved tunnel settings, checking the API server.."
+    /usr/local/bin/get_config_client.py || ret=$?
+
+    if [ $ret -eq ${GET_CONFIG_UNCHANGED} ]; then
+        bashio::log.info "API server reachable again, saved tunnel settings are current."
+    elif [ $ret -eq ${GET_CONFIG_UPDATED_LIVE} ]; then
+        bashio::log.info "API server reachable again, WireGuard peer settings updated without restarting the interface."
+        if [ -f "${GET_CONFIG_DIFF}" ] && jq -e '.nginx' "${GET_CONFIG_DIFF}" >/dev/null 2>&1; then
+            nginx -s stop
+            /etc/services.d/letsencrypt/run
+        fi
+    elif [ $ret -eq 0 ]; then
+        if [ -f "/etc/pluggie.state" ] && [ "$(cat /etc/pluggie.state)" = "invalid_key" ]; then
+            return 0
+        fi
+        bashio::log.warning "API server reachable again with new tunnel settings. Restarting WireGuard interface ${PLUGGIE_INTERFACE1}.."
+        if ! restart_wireguard; then
+            bashio::log.error "Failed to restart WireGuard interface ${PLUGGIE_INTERFACE1}. Please check your WireGuard configuration."
+            return 1
+        fi
+        nginx -s stop
+        /etc/services.d/letsencrypt/run
+    else
+        bashio::log.debug "API server still unreachable, keeping saved tunnel settings."
+        return 0
+    fi
+    touch /tmp/cert_verify_trigger
+}
+
+# get_config.py exit codes: settings identical to the applied ones, and
+# settings changed but already applied to the running WireGuard interface
+GET_CONFIG_UNCHANGED=3
+GET_CONFIG_UPDATED_LIVE=4
+GET_CONFIG_DIFF=/tmp/pluggie_settings_diff.json
+# Present while the tunnel runs on the last-known-good settings
+OFFLINE_SNAPSHOT_MARKER=/tmp/pluggie_offline_snapshot
+
 log_level=$(bashio::config 'log_level' 'info')
 bashio::log.level "${log_level}"
 export LOG_LEVEL=$(bashio::config 'log_level' 'info')
@@ -138,11 +173,14 @@ CURRENT_ENDPOINT_IP=""
 CURRENT_API_IP=""
 
 vpn_restart_needed=false
+endpoint_unresponsive=false
 
 # Check if we dont have some variables empty
 if [ -z "$PLUGGIE_HOSTNAME" ] || [ -z "$PLUGGIE_ENDPOINT1_SHORT" ] || [ -z "$PLUGGIE_ENDPOINT1_IP_INT" ]; then
     bashio::log.debug "Attempting to get configuration from API server..."
-    if /usr/local/bin/get_config.py; then
+    ret=0
+    /usr/local/bin/get_config_client.py || ret=$?
+    if [ $ret -eq 0 ] || [ $ret -eq ${GET_CONFIG_UNCHANGED} ] || [ $ret -eq ${GET_CONFIG_UPDATED_LIVE} ]; then
         # Read configuration from just refreshed /data/pluggie.json
         PLUGGIE_ENDPOINT1_SHORT=$(bashio::config 'pluggie_config.endpoint1_short')
         PLUGGIE_ENDPOINT1_IP=$(bashio::config 'pluggie_config.endpoint1_ip')
@@ -156,7 +194,6 @@ if [ -z "$PLUGGIE_HOSTNAME" ] || [ -z "$PLUGGIE_ENDPOINT1_SHORT" ] || [ -z "$PLU
         cat /dev/null > "/etc/pluggie.state"
         vpn_restart_needed=true
     else
-        ret=$?
         # Dont exit if there are connection issues
         if [ -f "/etc/pluggie.state" ] && [ "$(cat /etc/pluggie.state)" = "connectivity_issue" ]; then
             bashio::log.warning "Connectivity issues detected, keeping existing configuration and services running."
@@ -194,29 +231,32 @@ for server in "${dns_servers[@]}"; do
     fi
 done
 
+dns_failed=false
+
 # If all DNS checks failed
 if [ -z "${HOSTNAME_IP}" ]; then
     bashio::log.error "Error resolving hostname ${PLUGGIE_HOSTNAME}. No valid IPs found."
-    # 'sleep 60' instead of 'exit 1' to keep running for case the DNS records will become valid again
-    bashio::log.info "Sleeping for 60 seconds to run loop again"
-    sleep 60
-    # exit 1
+    dns_failed=true
 fi
 
 if [ -z "${CURRENT_ENDPOINT_IP}" ]; then
     bashio::log.error "Error resolving Pluggie endpoints. No valid IPs found. Keeping WireGuard up with old DNS records."
-    # 'sleep 60' instead of 'exit 1' to keep running for case the DNS records will become valid again
-    bashio::log.info "Sleeping for 60 seconds to run loop again"
-    sleep 60
-    # exit 1
+    dns_failed=true
 fi
 
 if [ -z "${CURRENT_API_IP}" ]; then
     bashio::log.error "Error resolving Pluggie API server. No valid IPs found. Keeping WireGuard up with old DNS records."
-    # 'sleep 60' instead of 'exit 1' to keep running for case the DNS records will become valid again
-    bashio::log.info "Sleeping for 60 seconds to run loop again"
-    sleep 60
-    # exit 1
+    dns_failed=true
+fi
+
+# Wait instead of 'exit 1' to keep running for case the DNS records will
+# become valid again; backoff with jitter while the lookups keep failing
+if [ "${dns_failed}" = true ]; then
+    delay=$(/usr/local/bin/retry_scheduler.py failure dns || echo 60)
+    bashio::log.info "Sleeping for ${delay} seconds to run loop again"
+    sleep "${delay}"
+else
+    /usr/local/bin/retry_scheduler.py success dns >/dev/null || true
 fi
 
 bashio::log.debug "HOSTNAME_IP: ${HOSTNAME_IP}" >&2
@@ -228,9 +268,8 @@ bashio::log.debug "PLUGGIE_INTERFACE1: ${PLUGGIE_INTERFACE1}" >&2
 # Check if hostname or endpoint IP changed
 if [ -n "${HOSTNAME_IP}" ] && [ -n "${CURRENT_ENDPOINT_IP}" ] && [ "${HOSTNAME_IP}" != "${CURRENT_ENDPOINT_IP}" ]; then
     bashio::log.error "Hostname IP (${HOSTNAME_IP}) does not match endpoint IP (${CURRENT_ENDPOINT_IP})"
-    bashio::log.info "Waiting for DNS propagation. Sleeping for 60 seconds to run loop again"
+    bashio::log.info "Waiting for DNS propagation before checking again"
     vpn_restart_needed=true
-    # sleep 60
     exit 1
 fi
 
@@ -262,6 +301,7 @@ if [ "${vpn_restart_needed}" = "false" ]; then
     if [ -n "${PLUGGIE_ENDPOINT1_IP_INT}" ] && ! ping -q -c 1 -W 3 "${PLUGGIE_ENDPOINT1_IP_INT}" >/dev/null 2>&1; then
         bashio::log.warning "Pluggie endpoint (${PLUGGIE_ENDPOINT1_IP_INT}) is not responding."
         vpn_restart_needed=true
+        endpoint_unresponsive=true
     fi
 fi
 
@@ -273,7 +313,9 @@ if [ "${vpn_restart_needed}" = true ]; then
     fi
 
     bashio::log.warning "Refreshing Pluggie configuration from API server.."
-    if /usr/local/bin/get_config.py; then
+    ret=0
+    /usr/local/bin/get_config_client.py || ret=$?
+    if [ $ret -eq 0 ] || [ $ret -eq ${GET_CONFIG_UNCHANGED} ] || [ $ret -eq ${GET_CONFIG_UPDATED_LIVE} ]; then
 
         # Check if Pluggie endpoint was unreachable (API rolled back, config unchanged)
         if [ -f "/etc/pluggie.state" ] && [ "$(cat /etc/pluggie.state)" = "endpoint_unreachable" ]; then
@@ -283,6 +325,26 @@ if [ "${vpn_restart_needed}" = true ]; then
 
         bashio::log.debug "Pluggie configuration refreshed."
 
+        # Same settings as before: WireGuard only needs a restart to recover
+        # an unresponsive tunnel, and nginx keeps its configuration.
+        if [ $ret -eq ${GET_CONFIG_UNCHANGED} ] && [ "${endpoint_unresponsive}" = false ]; then
+            bashio::log.info "Pluggie configuration unchanged. Keeping WireGuard and nginx running."
+            check_cert_renewal
+            exit 0
+        fi
+
+        # Peer changes (endpoint, keys, allowed IPs) were applied with
+        # wg syncconf; the interface and its connections stay up
+        if [ $ret -eq ${GET_CONFIG_UPDATED_LIVE} ] && [ "${endpoint_unresponsive}" = false ]; then
+            bashio::log.info "WireGuard peer settings updated without restarting the interface."
+            if [ -f "${GET_CONFIG_DIFF}" ] && jq -e '.nginx' "${GET_CONFIG_DIFF}" >/dev/null 2>&1; then
+                nginx -s stop
+                /etc/services.d/letsencrypt/run
+            fi
+            check_cert_renewal
+            exit 0
+        fi
+
         bashio::log.warning "Restarting WireGuard interface ${PLUGGIE_INTERFACE1}.."
         if restart_wireguard; then
             bashio::log.debug "Successfully restarted WireGuard interface ${PLUGGIE_INTERFACE1}."
@@ -293,15 +355,19 @@ if [ "${vpn_restart_needed}" = true ]; then
                 bashio::log.debug "Updated endpoint1_ip in pluggie.json"
             fi
 
-            # Restart nginx and refresh letsencrypt after wireguard
-            nginx -s stop
-            /etc/services.d/letsencrypt/run
+            # Restart nginx and refresh letsencrypt after wireguard, unless
+            # the settings they are generated from did not change
+            if [ $ret -eq ${GET_CONFIG_UNCHANGED} ]; then
+                bashio::log.debug "Pluggie configuration unchanged, keeping nginx running."
+            else
+                nginx -s stop
+                /etc/services.d/letsencrypt/run
+            fi
         else
             bashio::log.error "Failed to restart WireGuard interface ${PLUGGIE_INTERFACE1}. Please check your WireGuard configuration."
             exit 1
         fi
     else
-        ret=$?
         if [ $ret -eq 10 ]; then
             bashio::log.warning "Tunnel is disabled, skipping WireGuard and nginx operations"
             # Stop WireGuard if it's running
@@ -316,8 +382,12 @@ if [ "${vpn_restart_needed}" = true ]; then
     fi
 else
     bashio::log.debug "VPN connection is healthy. No need to restart WireGuard."
-    # Update state to enabled if it was connectivity_issue (recovered from outage)
-    if [ -f "/etc/pluggie.state" ] && [ "$(cat /etc/pluggie.state)" = "connectivity_issue" ]; then
+    if [ -f "${OFFLINE_SNAPSHOT_MARKER}" ]; then
+        # Started from saved settings; get_config.py sets the state once
+        # the API server answers
+        reconcile_offline_snapshot
+    elif [ -f "/etc/pluggie.state" ] && [ "$(cat /etc/pluggie.state)" = "connectivity_issue" ]; then
+        # Update state to enabled (recovered from outage)
         bashio::log.info "Connectivity restored, updating state to enabled."
         echo "enabled" > "/etc/pluggie.state"
         touch /tmp/cert_verify_trigger
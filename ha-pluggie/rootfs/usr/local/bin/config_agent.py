@@ -0,0 +1,111 @@
+#!/usr/local/bin/python
+"""
+Long-running get_config agent for Pluggie.
+
+Serves tunnel configuration refreshes on a local Unix socket so the
+periodic checks do not start a new interpreter each time. The parsed
+options, the keypair and the pooled HTTPS connections to the apiserver
+stay in memory between refreshes. Refreshes run one at a time.
+
+Protocol: one JSON line per connection, {"command": "get_config"},
+answered with {"exit_code": N} using the get_config.py exit codes.
+get_config_client.py is the matching command line client.
+"""
+
+import json
+import logging
+import os
+import signal
+import socketserver
+import sys
+import threading
+
+import get_config
+from get_config_client import AGENT_SOCKET
+from logger import setup_logging, reload_options_log_level
+
+OPTIONS_FILE = "/data/pluggie.json"
+
+_refresh_lock = threading.Lock()
+
+
+def run_refresh():
+    """
+    Run one get_config refresh in-process.
+
+    Returns:
+        int: The exit code get_config.py would have exited with.
+    """
+    with _refresh_lock:
+        # Follow log_level changes made in the UI
+        reload_options_log_level(OPTIONS_FILE)
+        try:
+            get_config.get_config()
+        except SystemExit as e:
+            if e.code is None:
+                return 0
+            return e.code if isinstance(e.code, int) else get_config.EXIT_FAILURE
+        except Exception as e:
+            logging.error(f"Configuration refresh failed: {e}")
+            return get_config.EXIT_FAILURE
+        return 0
+
+
+class AgentHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline() or b"{}")
+        except ValueError:
+            request = {}
+
+        if request.get("command") == "get_config":
+            response = {"exit_code": run_refresh()}
+        else:
+            response = {"exit_code": get_config.EXIT_FAILURE,
+                        "error": "Unknown command"}
+
+        try:
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+        except BrokenPipeError:
+            logging.debug("Client went away before the refresh finished")
+
+
+class AgentServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def run():
+    setup_logging()
+
+    os.makedirs(os.path.dirname(AGENT_SOCKET), exist_ok=True)
+    try:
+        os.unlink(AGENT_SOCKET)
+    except FileNotFoundError:
+        pass
+
+    # Socket only accessible to root
+    old_umask = os.umask(0o077)
+    try:
+        server = AgentServer(AGENT_SOCKET, AgentHandler)
+    finally:
+        os.umask(old_umask)
+
+    def shutdown(sig, frame):
+        logging.info("Stopping config agent")
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+
+    logging.info(f"Config agent listening on {AGENT_SOCKET}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        try:
+            os.unlink(AGENT_SOCKET)
+        except FileNotFoundError:
+            pass
+
+
+if __name__ == "__main__":
+    sys.exit(run())
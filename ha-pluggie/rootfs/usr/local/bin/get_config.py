@@ -2,21 +2,45 @@
 
 import os
 import sys
-import argparse
-import requests
+import copy
+import hashlib
 import socket
 import logging
 import json
+import queue
+import threading
+import time
 
-from wireguard_tools import WireguardKey
+import atomic_file
+import http_client
+import wg_config
 from logger import setup_logging, get_logger
 
+# requests, wireguard_tools and argparse are imported where they are used,
+# so importing this module (e.g. from config_agent.py) stays cheap
+
+
+# Parsed pluggie.json and keypair, reused while the files are unchanged
+# (matters when running inside config_agent.py)
+_options_cache = {}
+_keypair_cache = {}
+
+
+def _file_identity(path):
+    st = os.stat(path)
+    return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
 
 def load_options():
     """Load configuration from pluggie.json file"""
     try:
+        identity = _file_identity('/data/pluggie.json')
+        if _options_cache.get('identity') == identity:
+            return copy.deepcopy(_options_cache['options'])
         with open('/data/pluggie.json', 'r') as f:
-            return json.load(f)
+            options = json.load(f)
+        _options_cache.update(identity=identity, options=options)
+        return copy.deepcopy(options)
     except FileNotFoundError:
         logging.error("Error: pluggie.json file not found")
         sys.exit(1)
@@ -40,8 +64,8 @@ def save_options(options, updated_fields):
 
         update_dict_recursively(current_options, updated_fields)
 
-        with open('/data/pluggie.json', 'w') as f:
-            json.dump(current_options, f, indent=2, sort_keys=False)
+        atomic_file.write_json('/data/pluggie.json', current_options,
+                               indent=2, sort_keys=False)
 
         return current_options
     except Exception as e:
@@ -59,15 +83,23 @@ def resolve_hostname(hostname):
 
 def load_or_generate_keypair(pluggie_dir):
     """Load existing keypair from persistent storage or generate new one."""
+    from wireguard_tools import WireguardKey
+
     key_file = f"{pluggie_dir}/wireguard/client_key"
 
     if os.path.exists(key_file):
         try:
+            identity = _file_identity(key_file)
+            cached = _keypair_cache.get(key_file)
+            if cached and cached[0] == identity:
+                return cached[1]
             with open(key_file, 'r') as f:
                 stored_key = f.read().strip()
             p_key = WireguardKey(stored_key)
             logging.debug("Loaded existing keypair from persistent storage.")
-            return str(p_key), str(p_key.public_key())
+            keypair = str(p_key), str(p_key.public_key())
+            _keypair_cache[key_file] = (identity, keypair)
+            return keypair
         except Exception as e:
             logging.warning(f"Failed to load stored keypair: {e}. Generating new one.")
 
@@ -85,14 +117,159 @@ def load_or_generate_keypair(pluggie_dir):
 
 DEFAULT_APISERVER = "api.pluggie.net"
 
+# Seconds to wait for the configured apiserver before asking the default
+# one in parallel. Settings from the default apiserver win once it is
+# asked, so this is also the head start of the configured one.
+APISERVER_RACE_STAGGER = 3.0
+
+# Exit codes
+EXIT_FAILURE = 1
+EXIT_API_ERROR = 2
+# Settings are identical to the last applied ones; nothing was rewritten.
+# Callers treat it as success but can skip restarting WireGuard and nginx.
+EXIT_UNCHANGED = 3
+# Settings changed, but the running WireGuard interface was updated in
+# place (or needed no update); callers must not recreate it. Whether
+# nginx needs a restart is recorded in SETTINGS_DIFF_FILE.
+EXIT_UPDATED_LIVE = 4
+
+# Structured description of the last change, for the shell callers
+SETTINGS_DIFF_FILE = "/tmp/pluggie_settings_diff.json"
+
+# pluggie_config fields the nginx and letsencrypt setup depend on
+NGINX_SETTINGS = ("hostname", "email", "keyfile", "certfile",
+                  "http_port", "https_port")
+
+# Last applied settings document, its digest and ETag (in pluggie_dir).
+# Doubles as the last-known-good snapshot the tunnel is brought up from
+# when the apiserver cannot be reached at boot.
+APPLIED_SETTINGS_FILE = "wireguard/applied_settings.json"
+
+# Present while the tunnel runs on the snapshot; check_and_restart_wg.sh
+# reconciles with the apiserver until it is gone
+OFFLINE_SNAPSHOT_MARKER = "/tmp/pluggie_offline_snapshot"
+
 
 def write_state(state):
     with open("/etc/pluggie.state", "w") as f:
         f.write(state)
 
 
+def settings_digest(settings):
+    """Return a SHA-256 digest of the canonical JSON form of *settings*."""
+    canonical = json.dumps(settings, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def load_applied_settings(pluggie_dir):
+    """
+    Return the last applied settings record, or {} if there is none.
+
+    A record whose digest does not match its settings is discarded, so a
+    truncated or hand-edited snapshot is never used to bring up the tunnel.
+    """
+    try:
+        with open(f"{pluggie_dir}/{APPLIED_SETTINGS_FILE}", "r") as f:
+            applied = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(applied, dict):
+        return {}
+
+    settings = applied.get("settings")
+    if settings is not None:
+        try:
+            digest = settings_digest(settings["client_tunnel_settings"])
+        except (TypeError, KeyError):
+            digest = None
+        if digest is None or digest != applied.get("digest"):
+            logging.warning(
+                "Ignoring saved tunnel settings: checksum does not match"
+            )
+            return {}
+    return applied
+
+
+def save_applied_settings(pluggie_dir, data, digest, etag):
+    # Contains the preshared key, so keep it private like client_key
+    os.makedirs(f"{pluggie_dir}/wireguard", exist_ok=True)
+    atomic_file.write_json(
+        f"{pluggie_dir}/{APPLIED_SETTINGS_FILE}",
+        {"digest": digest, "etag": etag, "saved_at": int(time.time()),
+         "settings": data},
+        mode=0o600,
+    )
+
+
+def contains_fields(target, fields):
+    """Return True if every value in *fields* is already set in *target*."""
+    for key, value in fields.items():
+        if isinstance(value, dict):
+            if not isinstance(target.get(key), dict) \
+                    or not contains_fields(target[key], value):
+                return False
+        elif target.get(key) != value:
+            return False
+    return True
+
+
+def ping_apiserver(api_server, headers):
+    """
+    Check whether the apiserver answers at all.
+
+    Only used as a diagnostic after a failed settings request.
+
+    Returns:
+        bool: True if /api/ping answered with a non-5xx status.
+    """
+    import requests
+
+    try:
+        ping_url = f"https://{api_server}/api/ping"
+        ping_response = http_client.head(ping_url, headers=headers,
+                                         timeout=5, dependency="apiserver")
+        return ping_response.status_code < 500
+    except requests.exceptions.RequestException:
+        logging.warning(
+            f"Cannot reach API server {api_server} - connectivity issue."
+        )
+        return False
+
+
+def _settings_from_response(response):
+    """Return the settings document if a POST response already carries it."""
+    try:
+        data = response.json()
+    except ValueError:
+        return None
+    if isinstance(data, dict) and "client_tunnel_settings" in data:
+        return data
+    return None
+
+
 def try_apiserver(api_server, access_key, public_key, user_agent,
-                  interface1, timeout=10):
+                  interface1, timeout=10, etag=None, cancel=None):
+    """
+    Upload the public key and fetch the tunnel settings from one apiserver.
+
+    The POST and the GET go over the same pooled connection, and the GET
+    is skipped when the POST response already contains the settings. The
+    GET is conditional when *etag* is given.
+
+    Nothing is written here, so an attempt that loses the race in
+    fetch_settings() has no side effects besides the key upload.
+
+    Args:
+        cancel: threading.Event set when the answer is no longer needed.
+                No further request is sent once it is set; a request
+                already sent runs until its answer or timeout.
+
+    Returns:
+        tuple: (outcome, data, etag, state) where outcome is "ok",
+               "not_modified", "invalid_key", "disabled" or
+               "connectivity", and state is the value for
+               /etc/pluggie.state this answer calls for (or None).
+    """
     api_url = f"https://{api_server}/api/settings"
     headers = {
         "Authorization": f"Bearer {access_key}",
@@ -100,93 +277,201 @@ def try_apiserver(api_server, access_key, public_key, user_agent,
     }
     payload = {"access_key": access_key, "public_key": public_key}
 
-    try:
-        ping_url = f"https://{api_server}/api/ping"
-        ping_response = requests.head(ping_url, headers=headers, timeout=5)
-        connectivity_ok = ping_response.status_code < 500
-    except requests.exceptions.RequestException:
-        connectivity_ok = False
-        logging.warning(
-            f"Cannot reach API server {api_server} - connectivity issue."
-        )
+    import requests
+
+    state = None
+    if interface1 and os.path.exists(f"/etc/wireguard/{interface1}.conf"):
+        offline_state = "connectivity_issue"
+    else:
+        offline_state = "no_connection"
+
+    if cancel is not None and cancel.is_set():
+        return "connectivity", None, None, None
 
     try:
-        response = requests.post(api_url, headers=headers, json=payload,
-                                 timeout=timeout)
+        response = http_client.post(api_url, headers=headers, json=payload,
+                                    timeout=timeout, dependency="apiserver")
+
+        if cancel is not None and cancel.is_set():
+            response.close()
+            logging.debug(f"Dropping late answer from {api_server}")
+            return "connectivity", None, None, None
 
         if response.status_code == 200:
             logging.debug(f"Public Key upload to {api_server} succeeded")
+            data = _settings_from_response(response)
+            if data is not None:
+                return "ok", data, response.headers.get("ETag"), None
         elif response.status_code == 400:
             logging.error(f"Invalid data from {api_server}, status 400")
-            return "connectivity", None
+            return "connectivity", None, None, None
         elif response.status_code == 401:
             logging.warning(
                 f"Access key rejected by {api_server} (401)"
             )
-            return "invalid_key", None
+            return "invalid_key", None, None, None
         elif response.status_code == 403:
             logging.fatal(
                 f"Access denied by {api_server}: tunnel is disabled."
             )
-            write_state("disabled")
-            return "disabled", None
+            return "disabled", None, None, "disabled"
         elif response.status_code == 503:
             logging.warning(
                 f"Temporary server issue at {api_server}. "
                 "Using existing configuration."
             )
-            write_state("endpoint_unreachable")
+            state = "endpoint_unreachable"
         else:
-            if not connectivity_ok:
+            if not ping_apiserver(api_server, headers):
                 logging.warning(
                     f"API request to {api_server} failed "
                     f"(status {response.status_code}); connectivity issues."
                 )
-                if (interface1
-                        and os.path.exists(f"/etc/wireguard/{interface1}.conf")):
-                    write_state("connectivity_issue")
-                else:
-                    write_state("no_connection")
-                return "connectivity", None
+                return "connectivity", None, None, offline_state
             logging.error(
                 f"Error uploading Public Key to {api_server}, "
                 f"status {response.status_code}"
             )
-            return "connectivity", None
+            return "connectivity", None, None, None
 
     except requests.exceptions.RequestException as e:
         logging.warning(f"Connection error to {api_server}: {e}")
-        if (interface1
-                and os.path.exists(f"/etc/wireguard/{interface1}.conf")):
-            logging.info(
-                "Continuing with existing WireGuard configuration "
-                "due to connectivity issues."
-            )
-            write_state("connectivity_issue")
-        else:
-            logging.error(
-                "No existing configuration and cannot reach API."
-            )
-            write_state("no_connection")
-        return "connectivity", None
+        return "connectivity", None, None, offline_state
+
+    if cancel is not None and cancel.is_set():
+        return "connectivity", None, None, state
+
+    get_headers = dict(headers)
+    if etag:
+        get_headers["If-None-Match"] = etag
 
     try:
-        response = requests.get(api_url, headers=headers, timeout=timeout)
+        response = http_client.get(api_url, headers=get_headers,
+                                   timeout=timeout, dependency="apiserver")
+        if response.status_code == 304:
+            logging.debug(f"Settings at {api_server} not modified")
+            return "not_modified", None, etag, state
         response.raise_for_status()
         data = response.json()
     except requests.exceptions.RequestException as e:
         logging.error(f"GET {api_url} failed: {e}")
-        return "connectivity", None
+        return "connectivity", None, None, state
+
+    return "ok", data, response.headers.get("ETag"), state
+
+
+def fetch_settings(configured_apiserver, access_key, public_key, user_agent,
+                   interface1, etag=None):
+    """
+    Fetch the tunnel settings, racing the configured and default apiservers.
+
+    The default apiserver is asked in parallel once the configured one
+    has not answered within APISERVER_RACE_STAGGER seconds, or right away
+    when it answers without settings (401, connectivity error). From then
+    on the first settings from either server win, so a configured
+    apiserver slower than the stagger loses to a healthy default one.
+    Without settings the verdict of the configured apiserver stands, e.g.
+    a 401 is kept when the default apiserver is unreachable.
+
+    The losing attempt is cancelled: it sends no further requests and
+    its thread ends once the request in flight returns or times out.
+
+    Returns:
+        tuple: (api_server, outcome, data, etag, state), see
+               try_apiserver().
+    """
+    if configured_apiserver == DEFAULT_APISERVER:
+        return (configured_apiserver,) + try_apiserver(
+            configured_apiserver, access_key, public_key,
+            user_agent, interface1, etag=etag,
+        )
 
-    return "ok", data
+    results = queue.Queue()
+    cancel = threading.Event()
 
+    def attempt(api_server, attempt_etag):
+        try:
+            result = try_apiserver(api_server, access_key, public_key,
+                                   user_agent, interface1, etag=attempt_etag,
+                                   cancel=cancel)
+        except Exception as e:
+            logging.error(f"Settings request to {api_server} failed: {e}")
+            result = ("connectivity", None, None, None)
+        results.put((api_server, result))
 
-def main():
-    logger = setup_logging()
+    def start(api_server, attempt_etag=None):
+        # Daemon threads, so an abandoned attempt never delays exit
+        threading.Thread(target=attempt, args=(api_server, attempt_etag),
+                         name=f"apiserver-{api_server}", daemon=True).start()
 
-    parser = argparse.ArgumentParser("get_config.py")
-    parser.parse_args()
+    try:
+        start(configured_apiserver, etag)
+        fallback_deadline = time.monotonic() + APISERVER_RACE_STAGGER
+        fallback_started = False
+        pending = 1
+        configured_result = fallback_result = None
+
+        while pending:
+            timeout = None
+            if not fallback_started:
+                timeout = max(0, fallback_deadline - time.monotonic())
+            try:
+                api_server, result = results.get(timeout=timeout)
+            except queue.Empty:
+                logging.debug(
+                    f"No answer from {configured_apiserver} after "
+                    f"{APISERVER_RACE_STAGGER}s, asking {DEFAULT_APISERVER} "
+                    "in parallel"
+                )
+                start(DEFAULT_APISERVER)
+                fallback_started = True
+                pending += 1
+                continue
+
+            pending -= 1
+            outcome = result[0]
+            if api_server == configured_apiserver:
+                configured_result = result
+                if outcome in ("ok", "not_modified", "disabled"):
+                    return (api_server,) + result
+                if not fallback_started:
+                    logging.info(
+                        f"Retrying against default apiserver {DEFAULT_APISERVER} "
+                        f"after {outcome} from {configured_apiserver}"
+                    )
+                    start(DEFAULT_APISERVER)
+                    fallback_started = True
+                    pending += 1
+            else:
+                fallback_result = result
+                if outcome == "ok":
+                    if configured_result is None:
+                        logging.info(
+                            f"Default apiserver {DEFAULT_APISERVER} answered "
+                            f"first; not waiting for {configured_apiserver}"
+                        )
+                    return (api_server,) + result
+
+        if (configured_result[0] == "invalid_key"
+                and fallback_result[0] != "invalid_key"):
+            logging.warning(
+                f"Fallback to {DEFAULT_APISERVER} unreachable "
+                f"({fallback_result[0]}); keeping invalid_key verdict from "
+                f"{configured_apiserver}"
+            )
+        return (configured_apiserver,) + configured_result
+    finally:
+        # Stops the attempt that lost, or is no longer needed
+        cancel.set()
 
+
+def get_config():
+    """
+    Refresh the tunnel configuration from the apiserver.
+
+    Ends with sys.exit() using the exit codes above, or returns normally
+    (exit code 0) after writing the new configuration.
+    """
     options = load_options()
 
     # Read access_key from pluggie.json (single source of truth) with an
@@ -218,31 +503,43 @@ def main():
         pluggie_dir = "/data"
 
     private_key, public_key = load_or_generate_keypair(pluggie_dir)
+    applied = load_applied_settings(pluggie_dir)
+    cached_etag = applied.get("etag") if applied.get("settings") else None
 
-    outcome, data = try_apiserver(
+    api_server, outcome, data, etag, state = fetch_settings(
         configured_apiserver, access_key, public_key,
-        user_agent, interface1,
+        user_agent, interface1, etag=cached_etag,
     )
-    api_server = configured_apiserver
 
-    if outcome == "invalid_key" and configured_apiserver != DEFAULT_APISERVER:
-        logging.info(
-            f"Retrying against default apiserver {DEFAULT_APISERVER} "
-            f"after 401 from {configured_apiserver}"
+    offline = False
+    if (outcome == "connectivity" and state == "no_connection"
+            and applied.get("settings")):
+        # Boot during an apiserver outage: bring the tunnel up from the
+        # last-known-good settings right away
+        saved = ""
+        if applied.get("saved_at"):
+            saved = time.strftime(" at %Y-%m-%d %H:%M:%S",
+                                  time.localtime(applied["saved_at"]))
+        logging.warning(
+            f"Cannot reach the API server. Using the tunnel settings "
+            f"saved{saved} until it answers again."
         )
-        retry_outcome, retry_data = try_apiserver(
-            DEFAULT_APISERVER, access_key, public_key,
-            user_agent, interface1,
+        outcome, data, etag = "ok", applied["settings"], applied.get("etag")
+        state = "connectivity_issue"
+        offline = True
+
+    if state == "connectivity_issue":
+        logging.info(
+            "Continuing with existing WireGuard configuration "
+            "due to connectivity issues."
         )
-        if retry_outcome == "ok":
-            outcome, data = retry_outcome, retry_data
-            api_server = DEFAULT_APISERVER
-        elif retry_outcome != "invalid_key":
-            logging.warning(
-                f"Fallback to {DEFAULT_APISERVER} unreachable "
-                f"({retry_outcome}); keeping invalid_key verdict from "
-                f"{configured_apiserver}"
-            )
+    elif state == "no_connection":
+        logging.error("No existing configuration and cannot reach API.")
+    if state:
+        write_state(state)
+
+    if outcome == "not_modified":
+        outcome, data = "ok", applied["settings"]
 
     if outcome == "invalid_key":
         logging.fatal("Invalid Access Key. Please check your access key in Pluggie Configuration.")
@@ -250,20 +547,28 @@ def main():
         return 0
 
     if outcome in ("disabled", "connectivity"):
-        sys.exit(1)
+        sys.exit(EXIT_FAILURE)
 
     if outcome != "ok" or data is None:
         logging.error("Unexpected outcome from apiserver communication")
-        sys.exit(1)
+        sys.exit(EXIT_FAILURE)
 
     if data.get("status") != "success":
         logging.error(
             f"Error connecting API server {api_server}: {data.get('message')}"
         )
-        sys.exit(2)
+        sys.exit(EXIT_API_ERROR)
 
     config = data["client_tunnel_settings"]
-    write_state("enabled")
+    digest = settings_digest(config)
+    if offline:
+        open(OFFLINE_SNAPSHOT_MARKER, "w").close()
+    else:
+        write_state("enabled")
+        try:
+            os.unlink(OFFLINE_SNAPSHOT_MARKER)
+        except FileNotFoundError:
+            pass
 
     if config.get("apiserver") and config["apiserver"] != api_server:
         logging.info(
@@ -282,6 +587,8 @@ def main():
     # endpoint1 settings
     endpoint1_short, _ = config["endpoint1"].split(":")
     endpoint1_ip = resolve_hostname(endpoint1_short)
+    if endpoint1_ip is None and offline:
+        endpoint1_ip = options.get('pluggie_config', {}).get('endpoint1_ip')
 
     tunnel_updates = {
         'user_agent': user_agent,
@@ -301,35 +608,84 @@ def main():
         }
     }
 
-    options = save_options(options, tunnel_updates)
+    config1 = f"/etc/wireguard/{config['interface1']}.conf"
+    wg_conf = '\n'.join([
+        "[Interface]",
+        f"PrivateKey = {private_key}",
+        f"Address = {config['address1']}/24",
+        f"MTU = {config['mtu']}",
+        "",
+        "[Peer]",
+        f"PublicKey = {config['peer_public_key']}",
+        f"PreSharedKey = {config['preshared_key']}",
+        f"Endpoint = {config['endpoint1']}",
+        f"AllowedIPs = {config['allowed_ips1']}",
+        f"PersistentKeepalive = {config['keep_alive']}"
+    ])
 
-    if os.environ.get("SUPERVISOR_TOKEN"):
-        PLUGGIE_DIR = "/ssl/pluggie"
-    else:
-        PLUGGIE_DIR = "/data"
+    try:
+        with open(config1, "r") as f:
+            current_wg_config = f.read()
+    except OSError:
+        current_wg_config = None
+
+    if (digest == applied.get("digest")
+            and current_wg_config == wg_conf
+            and contains_fields(options, tunnel_updates)):
+        logging.debug("Tunnel settings unchanged, nothing to rewrite.")
+        if etag != applied.get("etag"):
+            save_applied_settings(pluggie_dir, data, digest, etag)
+        sys.exit(EXIT_UNCHANGED)
+
+    current_tunnel = options.get('pluggie_config', {})
+    endpoint_moved = current_tunnel.get('endpoint1_ip') != endpoint1_ip
+    nginx_changed = any(
+        current_tunnel.get(key) != tunnel_updates['pluggie_config'][key]
+        for key in NGINX_SETTINGS)
 
-    ssl_dir = f"{PLUGGIE_DIR}/wireguard"
-    os.makedirs(ssl_dir, exist_ok=True)
+    options = save_options(options, tunnel_updates)
 
-    config1 = f"/etc/wireguard/{config['interface1']}.conf"
     with open(config1, "w") as f:
-        wg_config = [
-            "[Interface]",
-            f"PrivateKey = {private_key}",
-            f"Address = {config['address1']}/24",
-            f"MTU = {config['mtu']}",
-            "",
-            "[Peer]",
-            f"PublicKey = {config['peer_public_key']}",
-            f"PreSharedKey = {config['preshared_key']}",
-            f"Endpoint = {config['endpoint1']}",
-            f"AllowedIPs = {config['allowed_ips1']}",
-            f"PersistentKeepalive = {config['keep_alive']}"
-        ]
-        f.write('\n'.join(wg_config))
+        f.write(wg_conf)
+
+    if not offline:
+        save_applied_settings(pluggie_dir, data, digest, etag)
 
     logging.debug("Configuration files updated successfully.")
 
+    # Peer-only changes are applied to the running interface; Address or
+    # MTU changes (or no running interface) need wg-quick down/up
+    action, changes = wg_config.plan(current_wg_config, wg_conf, endpoint_moved)
+    if action != "recreate" and not wg_config.interface_exists(config['interface1']):
+        action = "recreate"
+    if action == "live":
+        try:
+            wg_config.apply_live(config['interface1'], current_wg_config, wg_conf)
+            logging.info(
+                f"Applied WireGuard peer changes live: {', '.join(changes['peer']) or 'endpoint'}")
+        except (OSError, RuntimeError) as e:
+            logging.warning(f"Live WireGuard update failed, interface needs a restart: {e}")
+            action = "recreate"
+
+    atomic_file.write_json(SETTINGS_DIFF_FILE, {
+        "wireguard": dict(changes, action=action),
+        "nginx": nginx_changed,
+    }, indent=2)
+
+    if action != "recreate":
+        sys.exit(EXIT_UPDATED_LIVE)
+
+
+def main():
+    import argparse
+
+    logger = setup_logging()
+
+    parser = argparse.ArgumentParser("get_config.py")
+    parser.parse_args()
+
+    get_config()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,55 @@
+#!/usr/local/bin/python
+"""
+Thin client for config_agent.py.
+
+Asks the running agent to refresh the tunnel configuration and exits
+with the same exit code get_config.py would have. Only the standard
+library is imported, so a call costs little more than interpreter
+startup. When the agent is not running (e.g. during cont-init), it
+falls back to running get_config.py directly.
+"""
+
+import json
+import os
+import socket
+import sys
+
+AGENT_SOCKET = "/run/pluggie/config_agent.sock"
+GET_CONFIG = "/usr/local/bin/get_config.py"
+
+# A refresh does a few HTTP requests with 10 s timeouts each
+REQUEST_TIMEOUT = 120
+
+
+def run_direct():
+    os.execv(GET_CONFIG, [GET_CONFIG] + sys.argv[1:])
+
+
+def main():
+    # The debug key override only works in-process
+    if os.environ.get("PLUGGIE_ACCESS_KEY"):
+        run_direct()
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(AGENT_SOCKET)
+    except OSError:
+        sock.close()
+        run_direct()
+
+    # From here on the agent may already be working; never run a second
+    # refresh next to it
+    try:
+        with sock:
+            sock.settimeout(REQUEST_TIMEOUT)
+            sock.sendall(json.dumps({"command": "get_config"}).encode() + b"\n")
+            with sock.makefile("rb") as reply:
+                response = json.loads(reply.readline())
+        return int(response["exit_code"])
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"config agent request failed: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+#!/usr/local/bin/python
+"""
+Shared HTTP client for Pluggie Python scripts.
+
+Keeps one pooled requests Session per scheme and host, so repeated calls
+to the apiserver, the DoH resolvers or the proxied host reuse kept-alive
+TCP/TLS connections instead of paying a new handshake each time.  All
+outbound requests should go through request() (or the get/post/head
+helpers), which apply the default timeout and retry policy and record
+per-dependency metrics.
+
+requests is imported on first use, not at module import, so scripts that
+import this module start without paying for requests and urllib3.
+"""
+
+import logging
+import threading
+import time
+import urllib.parse
+
+from metrics import REGISTRY
+
+# (connect, read) timeout used when the caller does not pass one
+DEFAULT_TIMEOUT = (5, 10)
+
+# Kept-alive connections per host. The admin API serves requests from
+# several worker threads, so allow a few parallel connections.
+POOL_MAXSIZE = 4
+
+# Retry only failures to establish a connection. A request that reached
+# the server is never replayed, so non-idempotent POSTs stay safe.
+# (urllib3 Retry arguments)
+RETRY_POLICY = dict(
+    total=1,
+    connect=1,
+    read=0,
+    status=0,
+    other=0,
+    backoff_factor=0.2,
+    raise_on_status=False,
+)
+
+# urllib3 logs every connect retry as a warning; with the background
+# probes that floods the add-on log while a dependency is down. The final
+# failure is still raised to the caller and recorded in the metrics.
+logging.getLogger("urllib3.connectionpool").setLevel(logging.ERROR)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _pool_key(url):
+    """Return the (scheme, host:port) pair a URL is pooled under."""
+    parts = urllib.parse.urlsplit(url)
+    return parts.scheme.lower(), parts.netloc.lower()
+
+
+def get_session(url):
+    """
+    Return the pooled Session for the host of *url*.
+
+    Args:
+        url: Absolute http(s) URL.
+
+    Returns:
+        A requests.Session shared by all callers talking to that host.
+    """
+    key = _pool_key(url)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=POOL_MAXSIZE,
+                max_retries=Retry(**RETRY_POLICY),
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[key] = session
+        return session
+
+
+def request(method, url, timeout=DEFAULT_TIMEOUT, dependency=None,
+            **kwargs):
+    """
+    Send a request over the pooled Session of the target host.
+
+    Args:
+        method:     HTTP method.
+        url:        Absolute http(s) URL.
+        timeout:    Seconds, or a (connect, read) tuple.
+        dependency: Metrics label for the remote service (defaults to
+                    the host of *url*).
+        kwargs:     Passed through to requests.Session.request().
+
+    Returns:
+        A requests.Response.
+
+    Raises:
+        requests.exceptions.RequestException on transport errors.
+    """
+    if dependency is None:
+        dependency = _pool_key(url)[1]
+    labels = {"dependency": dependency}
+    status = "error"
+
+    REGISTRY.inc("pluggie_outbound_requests_in_flight", labels)
+    started = time.monotonic()
+    try:
+        response = get_session(url).request(
+            method, url, timeout=timeout, **kwargs,
+        )
+        status = str(response.status_code)
+        return response
+    finally:
+        REGISTRY.dec("pluggie_outbound_requests_in_flight", labels)
+        REGISTRY.observe(
+            "pluggie_outbound_request_duration_seconds",
+            time.monotonic() - started, labels,
+        )
+        REGISTRY.inc(
+            "pluggie_outbound_requests_total",
+            {"dependency": dependency, "method": method, "status": status},
+        )
+
+
+def get(url, **kwargs):
+    """Send a GET request through the shared pool."""
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    """Send a POST request through the shared pool."""
+    return request("POST", url, **kwargs)
+
+
+def head(url, **kwargs):
+    """Send a HEAD request through the shared pool (no redirects by default)."""
+    kwargs.setdefault("allow_redirects", False)
+    return request("HEAD", url, **kwargs)
+
+
+def close_all():
+    """Close all pooled sessions and their connections."""
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
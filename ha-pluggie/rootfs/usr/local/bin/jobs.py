@@ -0,0 +1,357 @@
+#!/usr/local/bin/python
+"""
+Serialized background jobs for the Pluggie admin API.
+
+A JobQueue runs jobs one at a time on a single worker thread. Each job
+is a set of named steps (shell commands or Python callables) forming a
+dependency graph: a step starts as soon as the steps it requires have
+finished, so independent steps run concurrently. Shell steps can have a
+timeout. Per-step exit codes, start offsets, durations and the tail of
+the captured output are kept for the most recent jobs.
+
+While a job is running at most one follow-up job is queued: later
+submissions are folded into it instead of piling up.
+"""
+
+import logging
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+# Finished jobs kept for the API
+JOB_HISTORY = 20
+# Lines of output kept per step
+OUTPUT_TAIL_LINES = 50
+# Grace period between SIGTERM and SIGKILL for a timed out step
+KILL_GRACE_PERIOD = 5
+
+
+def _timestamp(value):
+    if value is None:
+        return None
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(value))
+
+
+class Step:
+    """
+    One step of a job: a shell command or a callable returning an exit code.
+
+    Args:
+        name:       Unique name within the job.
+        command:    Shell command string or callable.
+        requires:   Names of steps that must finish before this one starts.
+                    A failed requirement does not prevent the step from
+                    running.
+        timeout:    Seconds a shell command may run (None for no limit).
+        on_timeout: "kill" terminates the command's process group;
+                    "detach" leaves it running in the background and lets
+                    the job continue.
+    """
+
+    def __init__(self, name, command, requires=(), timeout=None,
+                 on_timeout="kill"):
+        self.name = name
+        self.command = command
+        self.requires = tuple(requires)
+        self.timeout = timeout
+        self.on_timeout = on_timeout
+        self.status = "pending"
+        self.exit_code = None
+        self.start = None
+        self.duration = None
+        self.output = deque(maxlen=OUTPUT_TAIL_LINES)
+
+    @property
+    def failed(self):
+        return self.status in ("failed", "timeout", "skipped")
+
+    def run(self, job_started):
+        """
+        Execute the step and record its outcome.
+
+        Args:
+            job_started: time.monotonic() of the job start, used for the
+                         step's start offset.
+        """
+        self.status = "running"
+        started = time.monotonic()
+        self.start = round(started - job_started, 3)
+        try:
+            if callable(self.command):
+                self.exit_code = self.command() or 0
+            else:
+                self.exit_code = self._run_command(self.command)
+        except Exception as e:
+            logging.error(f"Step {self.name} failed: {e}")
+            self.output.append(str(e))
+            self.exit_code = 1
+        self.duration = round(time.monotonic() - started, 3)
+        if self.status == "running":
+            self.status = "succeeded" if self.exit_code == 0 else "failed"
+        return self.exit_code
+
+    def _mirror_output(self, stream):
+        # Mirror the output to our stdout so it still reaches the add-on
+        # log, and keep its tail for the API
+        for line in stream:
+            sys.stdout.write(line)
+            self.output.append(line.rstrip("\n"))
+        sys.stdout.flush()
+
+    def _run_command(self, command):
+        # Own process group, so a timeout also stops the command's children
+        process = subprocess.Popen(
+            command,
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            errors="replace",
+            start_new_session=True,
+        )
+        reader = threading.Thread(
+            target=self._mirror_output, args=(process.stdout,), daemon=True)
+        reader.start()
+
+        try:
+            exit_code = process.wait(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            if self.on_timeout == "detach":
+                logging.warning(f"Step {self.name} still running after {self.timeout}s, leaving it in the background")
+                self.status = "detached"
+                return None
+
+            logging.error(f"Step {self.name} timed out after {self.timeout}s, terminating it")
+            self.status = "timeout"
+            self._signal_group(process, signal.SIGTERM)
+            try:
+                process.wait(timeout=KILL_GRACE_PERIOD)
+            except subprocess.TimeoutExpired:
+                self._signal_group(process, signal.SIGKILL)
+                process.wait()
+            exit_code = process.returncode
+
+        reader.join(timeout=1)
+        return exit_code
+
+    @staticmethod
+    def _signal_group(process, sig):
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "status": self.status,
+            "requires": list(self.requires),
+            "exit_code": self.exit_code,
+            "start": self.start,
+            "duration": self.duration,
+            "output": "\n".join(self.output),
+        }
+
+
+class Job:
+    """A kind label and a dependency graph of steps."""
+
+    def __init__(self, job_id, kind, steps, not_before):
+        names = {step.name for step in steps}
+        for step in steps:
+            missing = set(step.requires) - names
+            if missing:
+                raise ValueError(f"Step {step.name} requires unknown steps: {sorted(missing)}")
+        self.id = job_id
+        self.kind = kind
+        self.steps = steps
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.duration = None
+        self.exit_code = None
+        self.requests = 1
+        self.not_before = not_before
+        self.first_requested = time.monotonic()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "requests": self.requests,
+            "created_at": _timestamp(self.created_at),
+            "started_at": _timestamp(self.started_at),
+            "finished_at": _timestamp(self.finished_at),
+            "duration": self.duration,
+            "exit_code": self.exit_code,
+            "steps": [step.to_dict() for step in self.steps],
+        }
+
+
+class JobQueue:
+    """
+    Single-worker job executor.
+
+    Args:
+        supersedes: Maps a job kind to the kinds it replaces while queued
+                    (e.g. a restart makes a queued apply unnecessary).
+        history:    Number of finished jobs to keep.
+    """
+
+    def __init__(self, supersedes=None, history=JOB_HISTORY):
+        self._supersedes = supersedes or {}
+        self._history = history
+        self._cond = threading.Condition()
+        self._jobs = OrderedDict()
+        self._queued = None
+        self._running = None
+        self._listeners = []
+        self._thread = None
+
+    def add_listener(self, callback):
+        """Register callback(job_dict), called after every finished job."""
+        self._listeners.append(callback)
+
+    def submit(self, kind, steps, delay=0, max_delay=None):
+        """
+        Queue a job, or fold the request into the already queued one.
+
+        Args:
+            kind:      Job kind label (e.g. "apply").
+            steps:     Callable returning a list of Step objects. It is
+                       only called when a new job has to be created.
+            delay:     Seconds to wait before starting; a later request
+                       folded into the job pushes the start back again.
+            max_delay: Upper bound on how long folding may postpone the
+                       job, measured from its first request.
+
+        Returns:
+            dict: The queued job.
+        """
+        with self._cond:
+            now = time.monotonic()
+            job = self._queued
+            if job is not None:
+                job.requests += 1
+                if kind != job.kind and job.kind in self._supersedes.get(kind, ()):
+                    job.kind = kind
+                    job.steps = steps()
+                not_before = now + delay
+                if max_delay is not None:
+                    not_before = min(not_before, job.first_requested + max_delay)
+                job.not_before = max(job.not_before, not_before)
+            else:
+                job = Job(uuid.uuid4().hex[:12], kind, steps(), now + delay)
+                self._queued = job
+                self._jobs[job.id] = job
+                self._trim()
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, daemon=True)
+                self._thread.name = "job-worker"
+                self._thread.start()
+            self._cond.notify()
+            return job.to_dict()
+
+    def get(self, job_id):
+        """Return a job as a dict, or None if unknown."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def list(self):
+        """Return queued, running and finished jobs, newest first."""
+        with self._cond:
+            return [job.to_dict() for job in reversed(self._jobs.values())]
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self._jobs.items()
+                    if job is not self._queued and job is not self._running]
+        for job_id in finished[:max(0, len(finished) - self._history)]:
+            del self._jobs[job_id]
+
+    @staticmethod
+    def _run_steps(job, started):
+        """Run the steps of *job*, each as soon as its requirements are done."""
+        pending = list(job.steps)
+        done = set()
+        running = 0
+        finished = queue.Queue()
+
+        def run(step):
+            try:
+                logging.debug(f"Job {job.id}: running step {step.name}")
+                step.run(started)
+                if step.failed:
+                    logging.error(f"Job {job.id}: step {step.name} {step.status} (exit code {step.exit_code})")
+            finally:
+                finished.put(step.name)
+
+        while pending or running:
+            for step in [step for step in pending
+                         if all(name in done for name in step.requires)]:
+                pending.remove(step)
+                thread = threading.Thread(target=run, args=(step,), daemon=True)
+                thread.name = f"job-step-{step.name}"
+                thread.start()
+                running += 1
+
+            if not running:
+                # Dependency cycle: nothing can start any more
+                for step in pending:
+                    step.status = "skipped"
+                break
+
+            done.add(finished.get())
+            running -= 1
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while True:
+                    job = self._queued
+                    if job is None:
+                        self._cond.wait()
+                        continue
+                    remaining = job.not_before - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                self._queued = None
+                self._running = job
+                job.status = "running"
+                job.started_at = time.time()
+
+            started = time.monotonic()
+            self._run_steps(job, started)
+            exit_code = 1 if any(step.failed for step in job.steps) else 0
+            logging.info(
+                f"Job {job.id} ({job.kind}) finished in "
+                f"{time.monotonic() - started:.1f}s: " + ", ".join(
+                    f"{step.name} {step.status} "
+                    f"+{step.start if step.start is not None else '-'}s "
+                    f"({step.duration if step.duration is not None else '-'}s)"
+                    for step in job.steps))
+
+            with self._cond:
+                job.duration = round(time.monotonic() - started, 3)
+                job.exit_code = exit_code
+                job.status = "succeeded" if exit_code == 0 else "failed"
+                job.finished_at = time.time()
+                self._running = None
+                self._trim()
+                result = job.to_dict()
+
+            for callback in list(self._listeners):
+                try:
+                    callback(result)
+                except Exception as e:
+                    logging.debug(f"Job listener failed: {e}")
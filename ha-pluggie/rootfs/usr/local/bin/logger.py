@@ -9,7 +9,6 @@ import os
 import sys
 import json
 import logging
-from enum import Enum
 
 
 class LogColor:
@@ -26,20 +25,6 @@ class LogColor:
     LIGHT_GRAY = "\033[37m"
 
 
-class LogLevel(Enum):
-    """Log levels matching Bashio log levels"""
-    ALL = 8
-    TRACE = 7
-    DEBUG = 6
-    INFO = 5
-    NOTICE = 4
-    WARNING = 3
-    ERROR = 2
-    FATAL = 1
-    CRITICAL = 1
-    OFF = 0
-
-
 # Mapping from Bashio log levels to Python logging levels
 BASHIO_TO_PYTHON_LOG_LEVELS = {
     'all': logging.DEBUG,
@@ -0,0 +1,165 @@
+#!/usr/local/bin/python
+"""
+Minimal in-process metrics registry for Pluggie Python scripts.
+
+Supports counters, gauges and histograms with labels, and renders them
+in the Prometheus text exposition format (version 0.0.4).  All
+operations are thread-safe.
+"""
+
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape_label_value(value):
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace('"', '\\"')
+    )
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape_label_value(value)}"' for name, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Histogram:
+    """Cumulative bucket counts, sum and count for one label set."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Registry of labelled metrics.
+
+    Metrics are declared once with describe() and then updated by name.
+    Labels are passed as a dict and stored in sorted order.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._descriptions = {}
+        self._values = {}
+
+    def describe(self, name, metric_type, help_text, buckets=DEFAULT_BUCKETS):
+        """
+        Declare a metric.
+
+        Args:
+            name:        Metric name.
+            metric_type: "counter", "gauge" or "histogram".
+            help_text:   HELP line shown in the exposition.
+            buckets:     Upper bounds for histogram buckets.
+        """
+        with self._lock:
+            self._descriptions[name] = (metric_type, help_text, tuple(buckets))
+            self._values.setdefault(name, {})
+
+    def inc(self, name, labels=None, amount=1):
+        """Increase a counter or gauge by *amount*."""
+        key = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            series = self._values[name]
+            series[key] = series.get(key, 0) + amount
+
+    def dec(self, name, labels=None, amount=1):
+        """Decrease a gauge by *amount*."""
+        self.inc(name, labels, -amount)
+
+    def observe(self, name, value, labels=None):
+        """Record *value* in a histogram."""
+        key = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            series = self._values[name]
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = _Histogram(self._descriptions[name][2])
+                series[key] = histogram
+            histogram.observe(value)
+
+    def render(self):
+        """
+        Render all metrics in the Prometheus text format.
+
+        Returns:
+            The exposition as a str.
+        """
+        lines = []
+        with self._lock:
+            for name, (metric_type, help_text, _) in sorted(
+                    self._descriptions.items()):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for key, value in sorted(self._values[name].items()):
+                    if metric_type == "histogram":
+                        lines.extend(self._render_histogram(name, key, value))
+                    else:
+                        lines.append(
+                            f"{name}{_format_labels(key)} "
+                            f"{_format_value(value)}"
+                        )
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_histogram(name, key, histogram):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            labels = _format_labels(key + (("le", _format_value(bound)),))
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = _format_labels(key + (("le", "+Inf"),))
+        lines.append(f"{name}_bucket{labels} {histogram.count}")
+        lines.append(
+            f"{name}_sum{_format_labels(key)} {_format_value(histogram.total)}"
+        )
+        lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return lines
+
+
+REGISTRY = MetricsRegistry()
+
+REGISTRY.describe(
+    "pluggie_outbound_requests_total", "counter",
+    "Outbound HTTP requests by dependency, method and status code.",
+)
+REGISTRY.describe(
+    "pluggie_outbound_requests_in_flight", "gauge",
+    "Outbound HTTP requests currently waiting for a response.",
+)
+REGISTRY.describe(
+    "pluggie_outbound_request_duration_seconds", "histogram",
+    "Outbound HTTP request latency by dependency.",
+)
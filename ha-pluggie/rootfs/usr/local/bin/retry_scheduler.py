@@ -0,0 +1,178 @@
+#!/usr/local/bin/python
+"""
+Retry scheduler for Pluggie retry loops.
+
+Every retry loop (apiserver, DNS checks, certificate renewal, the status
+cycle) has a named policy. After a failure the next attempt is scheduled
+with capped exponential backoff and full jitter, so a fleet of add-ons
+that failed together does not retry in lockstep. After a success the
+loop goes straight back to its normal interval.
+
+Failure counts and next attempt times of all loops are kept in one state
+file, locked with fcntl, so they survive between script runs.
+
+Shell usage (prints whole seconds, or exits 0/1 for "due"):
+
+    sleep "$(/usr/local/bin/retry_scheduler.py failure apiserver)"
+    /usr/local/bin/retry_scheduler.py success apiserver >/dev/null
+    sleep "$(/usr/local/bin/retry_scheduler.py delay status)"
+    /usr/local/bin/retry_scheduler.py due cert_renewal || exit 0
+"""
+
+import argparse
+import contextlib
+import fcntl
+import json
+import math
+import os
+import random
+import sys
+import time
+
+import atomic_file
+
+STATE_DIR = "/var/lib/pluggie"
+STATE_FILE = f"{STATE_DIR}/retry_state.json"
+LOCK_FILE = f"{STATE_DIR}/retry_state.lock"
+
+
+class Policy:
+    """
+    Retry timing of one loop, in seconds.
+
+    interval: normal cadence after a success
+    base:     upper bound of the first retry delay, doubled per failure
+    cap:      upper bound of the retry delay
+    floor:    lower bound of the retry delay
+    """
+
+    def __init__(self, interval, base, cap, floor=1):
+        self.interval = interval
+        self.base = base
+        self.cap = cap
+        self.floor = floor
+
+
+POLICIES = {
+    # 005-config.sh waiting for the apiserver at boot
+    "apiserver": Policy(interval=60, base=30, cap=600, floor=5),
+    # DNS checks of the hostname, endpoint and apiserver in
+    # check_and_restart_wg.sh
+    "dns": Policy(interval=60, base=60, cap=900, floor=15),
+    # DNS record validation in letsencrypt/run
+    "letsencrypt_dns": Policy(interval=60, base=60, cap=900, floor=15),
+    # Certificate renewal attempts; at most one per 12 hours
+    "cert_renewal": Policy(interval=12 * 3600, base=12 * 3600,
+                           cap=48 * 3600, floor=12 * 3600),
+    # status/run cycle running check_and_restart_wg.sh
+    "status": Policy(interval=60, base=60, cap=600, floor=30),
+}
+
+
+def backoff_delay(policy, failures, rng=random):
+    """
+    Return the delay before the next attempt after *failures* failures.
+
+    Full jitter: uniform between policy.floor and
+    min(policy.cap, policy.base * 2 ** (failures - 1)).
+
+    Args:
+        policy:   Policy of the loop.
+        failures: Consecutive failures so far (0 means no failure).
+        rng:      Random source (random module or random.Random).
+
+    Returns:
+        float: Delay in seconds.
+    """
+    if failures <= 0:
+        return policy.interval
+    ceiling = min(policy.cap, policy.base * 2 ** min(failures - 1, 32))
+    return rng.uniform(min(policy.floor, ceiling), ceiling)
+
+
+@contextlib.contextmanager
+def _locked_state():
+    """Yield the state dict under an exclusive lock; writes it if changed."""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    with open(LOCK_FILE, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(STATE_FILE, "r") as f:
+                state = json.load(f)
+            if not isinstance(state, dict):
+                state = {}
+        except (OSError, ValueError):
+            state = {}
+        original = json.dumps(state, sort_keys=True)
+
+        yield state
+
+        if json.dumps(state, sort_keys=True) != original:
+            atomic_file.write_json(STATE_FILE, state, indent=2)
+
+
+def failure(name):
+    """
+    Record a failed attempt of loop *name*.
+
+    Returns:
+        float: Seconds to wait before the next attempt.
+    """
+    now = time.time()
+    with _locked_state() as state:
+        entry = state.get(name) or {}
+        failures = entry.get("failures", 0) + 1
+        delay = backoff_delay(POLICIES[name], failures)
+        state[name] = {
+            "failures": failures,
+            "last_failure": int(now),
+            "next_at": now + delay,
+        }
+    return delay
+
+
+def success(name):
+    """
+    Record a successful attempt of loop *name*, resetting its backoff.
+
+    Returns:
+        float: Seconds to the next attempt at the normal cadence.
+    """
+    with _locked_state() as state:
+        state.pop(name, None)
+    return POLICIES[name].interval
+
+
+def delay(name):
+    """Return the seconds until loop *name* is due at its current backoff."""
+    with _locked_state() as state:
+        entry = state.get(name)
+    if not entry:
+        return POLICIES[name].interval
+    return max(0.0, entry.get("next_at", 0) - time.time())
+
+
+def due(name):
+    """Return True if loop *name* has no pending backoff."""
+    with _locked_state() as state:
+        entry = state.get(name)
+    return not entry or time.time() >= entry.get("next_at", 0)
+
+
+def main():
+    parser = argparse.ArgumentParser("retry_scheduler.py")
+    parser.add_argument("command", choices=("failure", "success", "delay", "due"))
+    parser.add_argument("name", choices=sorted(POLICIES))
+    args = parser.parse_args()
+
+    if args.command == "due":
+        return 0 if due(args.name) else 1
+
+    seconds = {"failure": failure, "success": success, "delay": delay}[
+        args.command](args.name)
+    print(math.ceil(seconds))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -58,6 +58,12 @@ else
     PLUGGIE_DIR=/data
 fi
 
+# Serve precompressed brotli assets if the static module is installed
+BROTLI_STATIC=""
+if [ -f "/usr/lib/nginx/modules/ngx_http_brotli_static_module.so" ]; then
+    BROTLI_STATIC="    brotli_static on;"
+fi
+
 CERT_DIR="${PLUGGIE_DIR}/letsencrypt/live/${PLUGGIE_HOSTNAME}"
 NGINX_CONF="/etc/nginx/http.d/default.conf"
 PLUGGIE_CONF="/etc/nginx/http.d/pluggie.conf"
@@ -97,6 +103,19 @@ server {
     access_log off;
     error_log /dev/null;
 
+    # Precompressed .gz/.br variants are written at image build time
+    gzip_static on;
+${BROTLI_STATIC}
+    # Pages are revalidated on every load (ETag / If-None-Match)
+    location / {
+        add_header Cache-Control "no-cache";
+    }
+
+    # Content-hashed assets never change under the same name
+    location ~ "\.[0-9a-f]{12}\.(png|ico|svg|css|js)\$" {
+        add_header Cache-Control "public, max-age=31536000, immutable";
+    }
+
     location /pluggie/api/ {
         proxy_pass http://127.0.0.1:8000;
         proxy_set_header Host \$host;
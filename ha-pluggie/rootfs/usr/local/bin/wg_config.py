@@ -0,0 +1,182 @@
+#!/usr/local/bin/python
+"""
+WireGuard configuration diffing for Pluggie.
+
+Compares two wg-quick configuration files and decides how a running
+interface can move from the old to the new one:
+
+- "none":     nothing to do
+- "live":     only peer settings (endpoint, preshared key, keepalive,
+              allowed IPs) or the private key changed; applied with
+              `wg syncconf` while the interface stays up
+- "recreate": Address or MTU changed (or there is no old config); the
+              interface has to go through wg-quick down/up
+
+The wg and ip binaries can be overridden with PLUGGIE_WG_BIN and
+PLUGGIE_IP_BIN, e.g. to run against stubs.
+"""
+
+import logging
+import os
+import subprocess
+import tempfile
+
+WG_BIN = os.environ.get("PLUGGIE_WG_BIN", "wg")
+IP_BIN = os.environ.get("PLUGGIE_IP_BIN", "ip")
+
+# wg-quick settings that only take effect when the interface is created
+RECREATE_KEYS = {"Address", "MTU", "DNS", "Table", "PreUp", "PostUp",
+                 "PreDown", "PostDown", "SaveConfig"}
+
+# Settings understood by `wg setconf`/`wg syncconf` (wg-quick extras removed)
+WG_INTERFACE_KEYS = ("PrivateKey", "ListenPort", "FwMark")
+WG_PEER_KEYS = ("PublicKey", "PresharedKey", "AllowedIPs", "Endpoint",
+                "PersistentKeepalive")
+
+# Keys are case-insensitive (e.g. PreSharedKey); map them to one spelling
+_CANONICAL_KEYS = {key.lower(): key for key in
+                   RECREATE_KEYS | set(WG_INTERFACE_KEYS) | set(WG_PEER_KEYS)}
+
+
+def parse(text):
+    """
+    Parse a single-peer wg-quick configuration.
+
+    Args:
+        text: Configuration file content (may be None).
+
+    Returns:
+        dict: {"Interface": {key: value}, "Peer": {key: value}}
+    """
+    sections = {"Interface": {}, "Peer": {}}
+    current = None
+    for line in (text or "").splitlines():
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            current = sections.setdefault(line[1:-1], {})
+            continue
+        if current is not None and "=" in line:
+            key, value = line.split("=", 1)
+            key = key.strip()
+            current[_CANONICAL_KEYS.get(key.lower(), key)] = value.strip()
+    return sections
+
+
+def _allowed_ips(peer):
+    return {ip.strip() for ip in peer.get("AllowedIPs", "").split(",")
+            if ip.strip()}
+
+
+def diff(old_text, new_text):
+    """
+    Return the changed keys per section.
+
+    Returns:
+        dict: {"interface": [keys], "peer": [keys]}
+    """
+    old, new = parse(old_text), parse(new_text)
+    result = {}
+    for section in ("Interface", "Peer"):
+        keys = set(old[section]) | set(new[section])
+        result[section.lower()] = sorted(
+            key for key in keys
+            if old[section].get(key) != new[section].get(key))
+    return result
+
+
+def plan(old_text, new_text, endpoint_moved=False):
+    """
+    Decide how to apply *new_text* to an interface running *old_text*.
+
+    Args:
+        old_text:       Current configuration (None if there is none).
+        new_text:       New configuration.
+        endpoint_moved: The endpoint host name resolves to a new address,
+                        so the endpoint has to be set again even if the
+                        configuration text is the same.
+
+    Returns:
+        tuple: (action, changes) with action "none", "live" or
+               "recreate" and changes as returned by diff().
+    """
+    changes = diff(old_text, new_text)
+    if not old_text:
+        return "recreate", changes
+    if RECREATE_KEYS.intersection(changes["interface"]):
+        return "recreate", changes
+
+    old_peer, new_peer = parse(old_text)["Peer"], parse(new_text)["Peer"]
+    if "PublicKey" in changes["peer"]:
+        # A different peer; syncconf could do it, but keep it simple and
+        # let wg-quick rebuild peers and routes
+        return "recreate", changes
+    if "AllowedIPs" in changes["peer"]:
+        # Default routes are set up by wg-quick with policy routing
+        if any(ip.endswith("/0") for ip in
+               _allowed_ips(old_peer) | _allowed_ips(new_peer)):
+            return "recreate", changes
+
+    if changes["interface"] or changes["peer"] or endpoint_moved:
+        return "live", changes
+    return "none", changes
+
+
+def strip(text):
+    """Return *text* reduced to the settings `wg syncconf` accepts."""
+    sections = parse(text)
+    lines = ["[Interface]"]
+    lines += [f"{key} = {sections['Interface'][key]}"
+              for key in WG_INTERFACE_KEYS if key in sections["Interface"]]
+    lines += ["", "[Peer]"]
+    lines += [f"{key} = {sections['Peer'][key]}"
+              for key in WG_PEER_KEYS if key in sections["Peer"]]
+    return "\n".join(lines) + "\n"
+
+
+def interface_exists(interface):
+    return os.path.isdir(f"/sys/class/net/{interface}")
+
+
+def _run(args):
+    logging.debug(f"Running: {' '.join(args)}")
+    result = subprocess.run(args, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(
+            f"{' '.join(args)} failed ({result.returncode}): "
+            f"{result.stderr.strip()}")
+
+
+def apply_live(interface, old_text, new_text):
+    """
+    Apply peer changes to a running interface without taking it down.
+
+    Runs `wg syncconf` with the stripped new configuration (which also
+    re-resolves the endpoint host name) and adds or removes the routes of
+    changed allowed IPs, as wg-quick would have done on up.
+
+    Raises:
+        RuntimeError if a command fails; the caller should then fall
+        back to recreating the interface.
+    """
+    fd, stripped_path = tempfile.mkstemp(prefix=f"{interface}.", suffix=".conf")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(strip(new_text))
+        _run([WG_BIN, "syncconf", interface, stripped_path])
+    finally:
+        os.unlink(stripped_path)
+
+    old_ips = _allowed_ips(parse(old_text)["Peer"])
+    new_ips = _allowed_ips(parse(new_text)["Peer"])
+    for cidr in sorted(new_ips - old_ips):
+        family = "-6" if ":" in cidr else "-4"
+        _run([IP_BIN, family, "route", "replace", cidr, "dev", interface])
+    for cidr in sorted(old_ips - new_ips):
+        family = "-6" if ":" in cidr else "-4"
+        try:
+            _run([IP_BIN, family, "route", "del", cidr, "dev", interface])
+        except RuntimeError as e:
+            # Route may never have been added (e.g. covered by Address)
+            logging.debug(f"Ignoring route removal failure: {e}")
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Tests for the admin API caches: TrafficCache (TTL, stale-while-revalidate,
+negative caching, single flight per key) and OptionsCache (re-parse on
+file change, derived views).
+
+    python3 -m unittest discover -s tests
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS_DIR, "..", "rootfs", "usr", "local", "bin"))
+
+from admin_api import OptionsCache, TrafficCache  # noqa: E402
+
+
+class FakeFetch:
+    """Stands in for _fetch_traffic; answers are set per access key."""
+
+    def __init__(self):
+        self.calls = []
+        self.answers = {}
+        self.gate = None
+
+    def __call__(self, api_server, access_key, user_agent):
+        self.calls.append(access_key)
+        if self.gate is not None:
+            self.gate.wait(5)
+        return self.answers.get(access_key, (True, {"key": access_key}))
+
+
+class TrafficCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fetch = FakeFetch()
+        self.cache = TrafficCache(fetch=self.fetch)
+
+    def get(self, key="k", ttl=30):
+        return self.cache.get("api.example", key, "ua", ttl=ttl)
+
+    def test_miss_then_hit(self):
+        first = self.get()
+        second = self.get()
+        self.assertEqual(first["cache"]["status"], "miss")
+        self.assertEqual(second["cache"]["status"], "hit")
+        self.assertEqual(second["key"], "k")
+        self.assertEqual(self.fetch.calls, ["k"])
+
+    def test_stale_served_while_refreshing(self):
+        self.get(ttl=0.1)
+        time.sleep(0.15)
+        self.fetch.answers["k"] = (True, {"key": "k", "fresh": True})
+
+        stale = self.get(ttl=0.1)
+        self.assertEqual(stale["cache"]["status"], "stale")
+        self.assertNotIn("fresh", stale)
+
+        deadline = time.monotonic() + 5
+        while len(self.fetch.calls) < 2 or "fresh" not in self.get(ttl=10):
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    def test_last_good_value_kept_on_error(self):
+        self.get(ttl=0.1)
+        time.sleep(0.15)
+        self.fetch.answers["k"] = (False, {"status": "error", "message": "down"})
+        self.get(ttl=0.1)
+        time.sleep(0.1)
+        result = self.get(ttl=0.1)
+        self.assertEqual(result["key"], "k")
+
+    def test_error_negatively_cached(self):
+        self.fetch.answers["k"] = (False, {"status": "error", "message": "down"})
+        first = self.get(ttl=0.2)
+        second = self.get(ttl=0.2)
+        self.assertEqual(first["message"], "down")
+        self.assertEqual(second["message"], "down")
+        self.assertEqual(self.fetch.calls, ["k"])
+
+        time.sleep(0.25)
+        self.get(ttl=0.2)
+        self.assertEqual(self.fetch.calls, ["k", "k"])
+
+    def test_concurrent_misses_share_one_fetch(self):
+        self.fetch.gate = threading.Event()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.get()))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        self.fetch.gate.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(self.fetch.calls, ["k"])
+        self.assertEqual([result["key"] for result in results], ["k"] * 5)
+
+    def test_key_change_does_not_join_old_flight(self):
+        gate = self.fetch.gate = threading.Event()
+        old = threading.Thread(target=self.get, args=("old",))
+        old.start()
+        time.sleep(0.1)
+        self.fetch.gate = None
+
+        result = self.get("new")
+        self.assertEqual(result["key"], "new")
+        self.assertEqual(self.fetch.calls, ["old", "new"])
+
+        # The old flight's late answer does not replace the new value
+        gate.set()
+        old.join(5)
+        self.assertEqual(self.get("new")["key"], "new")
+
+    def test_non_object_payload_passed_through(self):
+        self.fetch.answers["list"] = (True, [1, 2])
+        self.fetch.answers["null"] = (True, None)
+        self.assertEqual(self.get("list"), [1, 2])
+        self.assertIsNone(self.get("null"))
+        self.assertIsNone(self.get("null"))
+        self.assertEqual(self.fetch.calls, ["list", "null"])
+
+
+class OptionsCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "pluggie.json")
+        self.write({"log_level": "info"})
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, options):
+        with open(self.path, "w") as f:
+            json.dump(options, f)
+        # Make sure the change is visible even on coarse mtime clocks
+        st = os.stat(self.path)
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+    def test_reparsed_after_change(self):
+        cache = OptionsCache(self.path, revalidate_interval=0)
+        self.assertEqual(cache.get()["log_level"], "info")
+        self.write({"log_level": "debug"})
+        self.assertEqual(cache.get()["log_level"], "debug")
+
+    def test_revalidate_interval(self):
+        cache = OptionsCache(self.path, revalidate_interval=60)
+        self.assertEqual(cache.get()["log_level"], "info")
+        self.write({"log_level": "debug"})
+        self.assertEqual(cache.get()["log_level"], "info")
+
+    def test_views_built_once_per_version(self):
+        cache = OptionsCache(self.path, revalidate_interval=0)
+        builds = []
+
+        def builder(options):
+            builds.append(options["log_level"])
+            return options["log_level"].upper()
+
+        self.assertEqual(cache.view("level", builder), "INFO")
+        self.assertEqual(cache.view("level", builder), "INFO")
+        self.write({"log_level": "debug"})
+        self.assertEqual(cache.view("level", builder), "DEBUG")
+        self.assertEqual(builds, ["info", "debug"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Tests for jobs.JobQueue: folding and superseding of queued jobs, the
+debounce delay with its max_delay bound, and the step graph.
+
+    python3 -m unittest discover -s tests
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS_DIR, "..", "rootfs", "usr", "local", "bin"))
+
+from jobs import Job, JobQueue, Step  # noqa: E402
+
+
+def _wait_finished(jobs, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.get(job_id)
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} did not finish: {jobs.get(job_id)}")
+
+
+class Recorder:
+    """Steps factory that records when its steps ran."""
+
+    def __init__(self, name="run"):
+        self.name = name
+        self.ran_at = []
+
+    def _run(self):
+        self.ran_at.append(time.monotonic())
+
+    def __call__(self):
+        return [Step(self.name, self._run)]
+
+
+class FoldTest(unittest.TestCase):
+
+    def test_requests_fold_into_queued_job(self):
+        jobs = JobQueue()
+        apply = Recorder()
+        first = jobs.submit("apply", apply, delay=0.2)
+        second = jobs.submit("apply", apply, delay=0.2)
+        self.assertEqual(first["id"], second["id"])
+        self.assertEqual(second["requests"], 2)
+
+        job = _wait_finished(jobs, first["id"])
+        self.assertEqual(job["status"], "succeeded")
+        self.assertEqual(len(apply.ran_at), 1)
+
+    def test_restart_supersedes_queued_apply(self):
+        jobs = JobQueue(supersedes={"restart": ("apply",)})
+        apply, restart = Recorder("apply"), Recorder("restart")
+        queued = jobs.submit("apply", apply, delay=0.2)
+        folded = jobs.submit("restart", restart)
+        self.assertEqual(folded["id"], queued["id"])
+        self.assertEqual(folded["kind"], "restart")
+        self.assertEqual([step["name"] for step in folded["steps"]], ["restart"])
+
+        _wait_finished(jobs, queued["id"])
+        self.assertEqual(apply.ran_at, [])
+        self.assertEqual(len(restart.ran_at), 1)
+
+    def test_apply_does_not_supersede_restart(self):
+        jobs = JobQueue(supersedes={"restart": ("apply",)})
+        apply, restart = Recorder("apply"), Recorder("restart")
+        queued = jobs.submit("restart", restart, delay=0.2)
+        folded = jobs.submit("apply", apply)
+        self.assertEqual(folded["id"], queued["id"])
+        self.assertEqual(folded["kind"], "restart")
+
+        _wait_finished(jobs, queued["id"])
+        self.assertEqual(apply.ran_at, [])
+        self.assertEqual(len(restart.ran_at), 1)
+
+    def test_one_follow_up_while_running(self):
+        jobs = JobQueue()
+        release = threading.Event()
+        running = jobs.submit("apply", lambda: [Step("block", release.wait)])
+        deadline = time.monotonic() + 5
+        while jobs.get(running["id"])["status"] != "running":
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+        follow_ups = [jobs.submit("apply", Recorder()) for _ in range(3)]
+        self.assertEqual(len({job["id"] for job in follow_ups}), 1)
+        self.assertNotEqual(follow_ups[0]["id"], running["id"])
+        self.assertEqual(follow_ups[-1]["requests"], 3)
+
+        release.set()
+        _wait_finished(jobs, follow_ups[0]["id"])
+
+
+class DebounceTest(unittest.TestCase):
+
+    def test_later_request_pushes_start_back(self):
+        jobs = JobQueue()
+        apply = Recorder()
+        started = time.monotonic()
+        job = jobs.submit("apply", apply, delay=0.3)
+        time.sleep(0.2)
+        jobs.submit("apply", apply, delay=0.3)
+
+        _wait_finished(jobs, job["id"])
+        self.assertGreaterEqual(apply.ran_at[0] - started, 0.5)
+
+    def test_max_delay_bounds_postponing(self):
+        jobs = JobQueue()
+        apply = Recorder()
+        started = time.monotonic()
+        job = jobs.submit("apply", apply, delay=0.2, max_delay=0.4)
+        while time.monotonic() - started < 1.0 and not apply.ran_at:
+            jobs.submit("apply", apply, delay=0.2, max_delay=0.4)
+            time.sleep(0.05)
+
+        _wait_finished(jobs, job["id"])
+        elapsed = apply.ran_at[0] - started
+        self.assertGreaterEqual(elapsed, 0.4)
+        self.assertLess(elapsed, 0.8)
+
+
+class StepGraphTest(unittest.TestCase):
+
+    def test_requirements_run_first(self):
+        order = []
+        jobs = JobQueue()
+        job = jobs.submit("restart", lambda: [
+            Step("c", lambda: order.append("c"), requires=("a", "b")),
+            Step("a", lambda: order.append("a")),
+            Step("b", lambda: order.append("b"), requires=("a",)),
+        ])
+        _wait_finished(jobs, job["id"])
+        self.assertEqual(order, ["a", "b", "c"])
+
+    def test_failed_step_fails_job(self):
+        jobs = JobQueue()
+        job = jobs.submit("apply", lambda: [Step("fail", lambda: 3)])
+        job = _wait_finished(jobs, job["id"])
+        self.assertEqual(job["status"], "failed")
+        self.assertEqual(job["steps"][0]["exit_code"], 3)
+
+    def test_timeout_kills_command(self):
+        jobs = JobQueue()
+        job = jobs.submit("apply", lambda: [
+            Step("sleep", "sleep 5", timeout=0.2)])
+        job = _wait_finished(jobs, job["id"])
+        self.assertEqual(job["steps"][0]["status"], "timeout")
+        self.assertLess(job["duration"], 5)
+
+    def test_unknown_requirement_rejected(self):
+        with self.assertRaises(ValueError):
+            Job("id", "apply", [Step("a", lambda: 0, requires=("b",))], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
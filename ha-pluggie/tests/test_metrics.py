@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tests for metrics: histogram bucketing and the text exposition.
+
+    python3 -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS_DIR, "..", "rootfs", "usr", "local", "bin"))
+
+from metrics import MetricsRegistry  # noqa: E402
+
+
+def _samples(text):
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = value
+    return samples
+
+
+class HistogramTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.registry.describe("latency_seconds", "histogram", "Latency.",
+                               buckets=(0.1, 1.0, 5.0))
+
+    def test_le_buckets_are_inclusive_and_cumulative(self):
+        for value in (0.05, 0.1, 0.5, 1.0, 3.0, 7.0):
+            self.registry.observe("latency_seconds", value, {"dep": "api"})
+
+        samples = _samples(self.registry.render())
+        self.assertEqual(samples['latency_seconds_bucket{dep="api",le="0.1"}'], "2")
+        self.assertEqual(samples['latency_seconds_bucket{dep="api",le="1"}'], "4")
+        self.assertEqual(samples['latency_seconds_bucket{dep="api",le="5"}'], "5")
+        self.assertEqual(samples['latency_seconds_bucket{dep="api",le="+Inf"}'], "6")
+        self.assertEqual(samples['latency_seconds_count{dep="api"}'], "6")
+        self.assertAlmostEqual(
+            float(samples['latency_seconds_sum{dep="api"}']), 11.65)
+
+    def test_label_sets_are_separate(self):
+        self.registry.observe("latency_seconds", 0.2, {"dep": "a"})
+        self.registry.observe("latency_seconds", 0.2, {"dep": "b"})
+        self.registry.observe("latency_seconds", 0.2, {"dep": "b"})
+
+        samples = _samples(self.registry.render())
+        self.assertEqual(samples['latency_seconds_count{dep="a"}'], "1")
+        self.assertEqual(samples['latency_seconds_count{dep="b"}'], "2")
+
+
+class CounterGaugeTest(unittest.TestCase):
+
+    def test_counter_and_gauge(self):
+        registry = MetricsRegistry()
+        registry.describe("requests_total", "counter", "Requests.")
+        registry.describe("in_flight", "gauge", "In flight.")
+        registry.inc("requests_total", {"status": "200", "method": "GET"})
+        registry.inc("requests_total", {"method": "GET", "status": "200"})
+        registry.inc("in_flight")
+        registry.inc("in_flight")
+        registry.dec("in_flight")
+
+        text = registry.render()
+        self.assertIn("# TYPE requests_total counter", text)
+        samples = _samples(text)
+        self.assertEqual(
+            samples['requests_total{method="GET",status="200"}'], "2")
+        self.assertEqual(samples["in_flight"], "1")
+
+    def test_label_values_escaped(self):
+        registry = MetricsRegistry()
+        registry.describe("errors_total", "counter", "Errors.")
+        registry.inc("errors_total", {"message": 'say "hi"\n'})
+        self.assertIn('errors_total{message="say \\"hi\\"\\n"} 1',
+                      registry.render())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Tests for retry_scheduler: backoff_delay bounds and the persisted state.
+
+    python3 -m unittest discover -s tests
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS_DIR, "..", "rootfs", "usr", "local", "bin"))
+
+import retry_scheduler  # noqa: E402
+from retry_scheduler import Policy, backoff_delay  # noqa: E402
+
+
+class BackoffDelayTest(unittest.TestCase):
+
+    def test_no_failure_is_interval(self):
+        policy = Policy(interval=60, base=30, cap=600, floor=5)
+        self.assertEqual(backoff_delay(policy, 0), 60)
+
+    def test_bounds(self):
+        policy = Policy(interval=60, base=30, cap=600, floor=5)
+        rng = random.Random(1)
+        for failures in range(1, 12):
+            ceiling = min(600, 30 * 2 ** (failures - 1))
+            delays = [backoff_delay(policy, failures, rng) for _ in range(200)]
+            with self.subTest(failures=failures):
+                self.assertGreaterEqual(min(delays), 5)
+                self.assertLessEqual(max(delays), ceiling)
+
+    def test_jittered(self):
+        policy = retry_scheduler.POLICIES["apiserver"]
+        rng = random.Random(2)
+        delays = {round(backoff_delay(policy, 5, rng), 3) for _ in range(20)}
+        self.assertGreater(len(delays), 1)
+
+    def test_many_failures_stay_at_cap(self):
+        policy = Policy(interval=60, base=30, cap=600, floor=5)
+        self.assertLessEqual(backoff_delay(policy, 10000), 600)
+
+    def test_floor_equal_to_base(self):
+        # cert_renewal: floor equals base, so the first retry is exact
+        policy = retry_scheduler.POLICIES["cert_renewal"]
+        self.assertEqual(backoff_delay(policy, 1), 12 * 3600)
+
+
+class PersistedStateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self._saved = (retry_scheduler.STATE_DIR, retry_scheduler.STATE_FILE,
+                       retry_scheduler.LOCK_FILE)
+        retry_scheduler.STATE_DIR = os.path.join(self.tmpdir.name, "pluggie")
+        retry_scheduler.STATE_FILE = os.path.join(
+            retry_scheduler.STATE_DIR, "retry_state.json")
+        retry_scheduler.LOCK_FILE = os.path.join(
+            retry_scheduler.STATE_DIR, "retry_state.lock")
+
+    def tearDown(self):
+        (retry_scheduler.STATE_DIR, retry_scheduler.STATE_FILE,
+         retry_scheduler.LOCK_FILE) = self._saved
+        self.tmpdir.cleanup()
+
+    def _state(self):
+        with open(retry_scheduler.STATE_FILE) as f:
+            return json.load(f)
+
+    def test_failures_accumulate(self):
+        before = time.time()
+        for expected in (1, 2, 3):
+            delay = retry_scheduler.failure("apiserver")
+            entry = self._state()["apiserver"]
+            self.assertEqual(entry["failures"], expected)
+            self.assertAlmostEqual(entry["next_at"], time.time() + delay, delta=1)
+        self.assertGreaterEqual(entry["last_failure"], int(before))
+
+    def test_delay_and_due_follow_failure(self):
+        self.assertTrue(retry_scheduler.due("dns"))
+        self.assertEqual(retry_scheduler.delay("dns"), 60)
+
+        delay = retry_scheduler.failure("dns")
+        self.assertFalse(retry_scheduler.due("dns"))
+        self.assertLessEqual(retry_scheduler.delay("dns"), delay)
+        self.assertGreater(retry_scheduler.delay("dns"), 0)
+
+    def test_success_resets(self):
+        retry_scheduler.failure("status")
+        retry_scheduler.failure("dns")
+        self.assertEqual(retry_scheduler.success("status"), 60)
+        self.assertNotIn("status", self._state())
+        self.assertIn("dns", self._state())
+        self.assertTrue(retry_scheduler.due("status"))
+
+    def test_corrupt_state_is_reset(self):
+        os.makedirs(retry_scheduler.STATE_DIR)
+        with open(retry_scheduler.STATE_FILE, "w") as f:
+            f.write("not json")
+        self.assertTrue(retry_scheduler.due("apiserver"))
+        retry_scheduler.failure("apiserver")
+        self.assertEqual(self._state()["apiserver"]["failures"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
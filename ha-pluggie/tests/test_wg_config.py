@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Tests for wg_config: plan() decisions and apply_live() against the stub
+wg and ip binaries in tests/stubs.
+
+    python3 -m unittest discover -s tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+STUBS_DIR = os.path.join(TESTS_DIR, "stubs")
+sys.path.insert(0, os.path.join(TESTS_DIR, "..", "rootfs", "usr", "local", "bin"))
+
+import wg_config  # noqa: E402
+
+OLD_CONFIG = """\
+[Interface]
+PrivateKey = aPrivateKey=
+Address = 10.8.0.2/32
+MTU = 1420
+DNS = 1.1.1.1
+
+[Peer]
+PublicKey = aPublicKey=
+PresharedKey = aPresharedKey=
+AllowedIPs = 10.8.0.1/32, 192.168.50.0/24
+Endpoint = tunnel.example.com:51820
+PersistentKeepalive = 25
+"""
+
+
+def _change(text, key, value):
+    lines = []
+    for line in text.splitlines():
+        if line.split("=", 1)[0].strip() == key:
+            line = f"{key} = {value}"
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+class PlanTest(unittest.TestCase):
+
+    def test_unchanged(self):
+        self.assertEqual(wg_config.plan(OLD_CONFIG, OLD_CONFIG)[0], "none")
+
+    def test_endpoint_moved(self):
+        action, _ = wg_config.plan(OLD_CONFIG, OLD_CONFIG, endpoint_moved=True)
+        self.assertEqual(action, "live")
+
+    def test_no_old_config(self):
+        self.assertEqual(wg_config.plan(None, OLD_CONFIG)[0], "recreate")
+
+    def test_address_and_mtu_recreate(self):
+        for key, value in (("Address", "10.8.0.3/32"), ("MTU", "1380")):
+            with self.subTest(key=key):
+                action, changes = wg_config.plan(
+                    OLD_CONFIG, _change(OLD_CONFIG, key, value))
+                self.assertEqual(action, "recreate")
+                self.assertEqual(changes["interface"], [key])
+
+    def test_peer_changes_live(self):
+        for key, value in (("Endpoint", "tunnel.example.com:51821"),
+                           ("PresharedKey", "otherPresharedKey="),
+                           ("PersistentKeepalive", "15"),
+                           ("AllowedIPs", "10.8.0.1/32, 192.168.60.0/24")):
+            with self.subTest(key=key):
+                action, changes = wg_config.plan(
+                    OLD_CONFIG, _change(OLD_CONFIG, key, value))
+                self.assertEqual(action, "live")
+                self.assertEqual(changes, {"interface": [], "peer": [key]})
+
+    def test_private_key_live(self):
+        action, _ = wg_config.plan(
+            OLD_CONFIG, _change(OLD_CONFIG, "PrivateKey", "otherKey="))
+        self.assertEqual(action, "live")
+
+    def test_keys_case_insensitive(self):
+        new = OLD_CONFIG.replace("PresharedKey =", "PreSharedKey =")
+        self.assertEqual(wg_config.plan(OLD_CONFIG, new)[0], "none")
+
+    def test_public_key_recreate(self):
+        action, _ = wg_config.plan(
+            OLD_CONFIG, _change(OLD_CONFIG, "PublicKey", "otherPublicKey="))
+        self.assertEqual(action, "recreate")
+
+    def test_default_route_recreate(self):
+        action, _ = wg_config.plan(
+            OLD_CONFIG, _change(OLD_CONFIG, "AllowedIPs", "0.0.0.0/0"))
+        self.assertEqual(action, "recreate")
+
+
+class ApplyLiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.log = os.path.join(self.tmpdir.name, "calls")
+        environ = {"PLUGGIE_STUB_LOG": self.log}
+        self._saved_environ = {key: os.environ.get(key) for key in
+                               (*environ, "PLUGGIE_STUB_IP_DEL_FAIL")}
+        os.environ.update(environ)
+        self._saved_bins = wg_config.WG_BIN, wg_config.IP_BIN
+        wg_config.WG_BIN = os.path.join(STUBS_DIR, "wg")
+        wg_config.IP_BIN = os.path.join(STUBS_DIR, "ip")
+
+    def tearDown(self):
+        wg_config.WG_BIN, wg_config.IP_BIN = self._saved_bins
+        for key, value in self._saved_environ.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self.tmpdir.cleanup()
+
+    def _calls(self):
+        if not os.path.exists(self.log):
+            return []
+        with open(self.log) as f:
+            return f.read().splitlines()
+
+    def _synced_config(self):
+        with open(self.log + ".conf") as f:
+            return f.read()
+
+    def test_peer_change_syncconf(self):
+        new = _change(OLD_CONFIG, "Endpoint", "tunnel.example.com:51821")
+        wg_config.apply_live("wg0", OLD_CONFIG, new)
+
+        calls = self._calls()
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(calls[0].startswith("wg syncconf wg0 "))
+        # The temporary stripped configuration is removed afterwards
+        self.assertFalse(os.path.exists(calls[0].split()[-1]))
+
+        # Only settings wg understands are passed, wg-quick ones are dropped
+        synced = wg_config.parse(self._synced_config())
+        self.assertEqual(synced["Interface"], {"PrivateKey": "aPrivateKey="})
+        self.assertEqual(synced["Peer"]["Endpoint"], "tunnel.example.com:51821")
+        for key in ("Address", "MTU", "DNS"):
+            self.assertNotIn(key, self._synced_config())
+
+    def test_allowed_ips_routes(self):
+        new = _change(OLD_CONFIG, "AllowedIPs",
+                      "10.8.0.1/32, 192.168.60.0/24, fd00::/64")
+        wg_config.apply_live("wg0", OLD_CONFIG, new)
+
+        calls = self._calls()
+        self.assertTrue(calls[0].startswith("wg syncconf wg0 "))
+        self.assertEqual(calls[1:], [
+            "ip -4 route replace 192.168.60.0/24 dev wg0",
+            "ip -6 route replace fd00::/64 dev wg0",
+            "ip -4 route del 192.168.50.0/24 dev wg0",
+        ])
+
+    def test_route_removal_failure_ignored(self):
+        os.environ["PLUGGIE_STUB_IP_DEL_FAIL"] = "1"
+        new = _change(OLD_CONFIG, "AllowedIPs", "10.8.0.1/32")
+        wg_config.apply_live("wg0", OLD_CONFIG, new)
+        self.assertEqual(self._calls()[-1],
+                         "ip -4 route del 192.168.50.0/24 dev wg0")
+
+    def test_command_failure_raises(self):
+        wg_config.WG_BIN = "false"
+        with self.assertRaises(RuntimeError):
+            wg_config.apply_live("wg0", OLD_CONFIG, OLD_CONFIG)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the Pluggie Python scripts.
+
+Reports for each entry point:
+- the `python -X importtime` breakdown (total and slowest imports)
+- for the long-running services, the wall-clock time from process start
+  until the port or socket accepts connections (time-to-listen) and
+  until the first request is answered (time-to-first-request)
+
+Run it inside the add-on image (or any environment with the add-on's
+Python dependencies), with the services stopped: admin_api.py binds port
+8000 and config_agent.py takes over its Unix socket.
+
+    python3 tools/bench_startup.py [--runs 5] [--top 10]
+"""
+
+import argparse
+import http.client
+import os
+import re
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+BIN_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..", "rootfs", "usr", "local", "bin",
+)
+
+# Modules whose import cost is measured
+IMPORT_MODULES = (
+    "logger",
+    "http_client",
+    "cert_verify",
+    "get_config",
+    "get_config_client",
+    "config_agent",
+    "admin_api",
+)
+
+ADMIN_API_PORT = 8000
+ADMIN_API_FIRST_REQUEST = "/pluggie/api/health"
+AGENT_SOCKET = "/run/pluggie/config_agent.sock"
+
+# Give up on a service that does not come up within this many seconds
+STARTUP_TIMEOUT = 30
+POLL_INTERVAL = 0.005
+
+_IMPORTTIME_LINE = re.compile(
+    r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def _env():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [BIN_DIR, env.get("PYTHONPATH")]))
+    env.setdefault("LOG_LEVEL", "warning")
+    return env
+
+
+def measure_imports(python, module):
+    """
+    Import *module* in a fresh interpreter with -X importtime.
+
+    Returns:
+        tuple: (total_us, [(cumulative_us, name), ...]) where the list
+               holds the direct and indirect imports of *module*.
+    """
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        env=_env(), capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    # Children are printed before their parent; everything printed after
+    # `site` belongs to the import of the module itself
+    entries = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        name = match.group(4)
+        if name == "site":
+            entries = []
+            continue
+        entries.append((int(match.group(2)), name))
+
+    total = next((cumulative for cumulative, name in reversed(entries)
+                  if name == module), 0)
+    return total, [entry for entry in entries if entry[1] != module]
+
+
+def _wait_until(predicate, process):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"exited with code {process.returncode}")
+        if predicate():
+            return
+        time.sleep(POLL_INTERVAL)
+    raise RuntimeError(f"not ready after {STARTUP_TIMEOUT} s")
+
+
+def _tcp_ready(port):
+    try:
+        socket.create_connection(("127.0.0.1", port), timeout=1).close()
+        return True
+    except OSError:
+        return False
+
+
+def _unix_ready(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def _admin_api_request():
+    conn = http.client.HTTPConnection(
+        "127.0.0.1", ADMIN_API_PORT, timeout=STARTUP_TIMEOUT)
+    try:
+        conn.request("GET", ADMIN_API_FIRST_REQUEST)
+        conn.getresponse().read()
+    finally:
+        conn.close()
+
+
+def _agent_request():
+    # An unknown command is answered right away without a refresh
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(STARTUP_TIMEOUT)
+    try:
+        sock.connect(AGENT_SOCKET)
+        sock.sendall(b'{"command": "ping"}\n')
+        sock.makefile("rb").readline()
+    finally:
+        sock.close()
+
+
+SERVICES = {
+    "admin_api.py": (lambda: _tcp_ready(ADMIN_API_PORT), _admin_api_request),
+    "config_agent.py": (lambda: _unix_ready(AGENT_SOCKET), _agent_request),
+}
+
+
+def measure_service(python, script):
+    """
+    Start *script* and time it until it listens and answers a request.
+
+    Returns:
+        tuple: (time_to_listen, time_to_first_request) in seconds.
+    """
+    ready, first_request = SERVICES[script]
+    if ready():
+        raise RuntimeError("already running, stop the service first")
+
+    started = time.monotonic()
+    process = subprocess.Popen(
+        [python, os.path.join(BIN_DIR, script)], env=_env(),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_until(ready, process)
+        listening = time.monotonic() - started
+        first_request()
+        answered = time.monotonic() - started
+        return listening, answered
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def _ms(values):
+    return (f"{statistics.median(values) * 1000:8.1f} ms"
+            f"  (min {min(values) * 1000:.1f})")
+
+
+def main():
+    parser = argparse.ArgumentParser("bench_startup.py")
+    parser.add_argument("--python", default=sys.executable,
+                        help="interpreter to benchmark (default: this one)")
+    parser.add_argument("--runs", type=int, default=5,
+                        help="repetitions per measurement (default: 5)")
+    parser.add_argument("--top", type=int, default=10,
+                        help="slowest imports listed per module (default: 10)")
+    parser.add_argument("--imports-only", action="store_true",
+                        help="skip starting the services")
+    args = parser.parse_args()
+
+    print(f"Import time (median of {args.runs} runs, -X importtime)")
+    for module in IMPORT_MODULES:
+        totals, breakdown = [], {}
+        try:
+            for _ in range(args.runs):
+                total, entries = measure_imports(args.python, module)
+                totals.append(total / 1e6)
+                for cumulative, name in entries:
+                    breakdown.setdefault(name, []).append(cumulative)
+        except RuntimeError as e:
+            print(f"\n{module}: failed: {e}")
+            continue
+
+        print(f"\n{module}: {_ms(totals)}")
+        slowest = sorted(
+            ((statistics.median(values), name)
+             for name, values in breakdown.items()),
+            reverse=True,
+        )[:args.top]
+        for cumulative, name in slowest:
+            print(f"    {cumulative / 1000:8.1f} ms  {name}")
+
+    if args.imports_only:
+        return 0
+
+    print(f"\nService startup (median of {args.runs} runs)")
+    for script in SERVICES:
+        listen, first = [], []
+        try:
+            for _ in range(args.runs):
+                listening, answered = measure_service(args.python, script)
+                listen.append(listening)
+                first.append(answered)
+        except RuntimeError as e:
+            print(f"\n{script}: failed: {e}")
+            continue
+        print(f"\n{script}")
+        print(f"    time-to-listen:        {_ms(listen)}")
+        print(f"    time-to-first-request: {_ms(first)}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())